@@ -1 +1,9 @@
-from .readTDR import *
\ No newline at end of file
+from .readTDR import *
+from .watch import watch_tdr
+from .stats import QuantileSketch, SessionStats
+from .validate import ValidationIssue, ValidationReport, validate_tdr, validate_archive
+from .events import EventCode, EventDtype, find_trials, find_intervals
+from .service import TDRService, TDRClient, SharedTrialTable
+from .summary import SessionSummary, quick_summary, summarize_archive
+from .aggregate import ConditionAggregate, aggregate_tdr, aggregate_file, aggregate_archive
+from .timing import TimingReport, get_interval_timing, get_timing_report, read_timing_report, audit_archive
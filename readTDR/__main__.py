@@ -0,0 +1,92 @@
+import argparse
+import dataclasses
+import pathlib
+
+from .readTDR import TrialOutcome
+from .service import DefaultAddress, run_service
+from .summary import SessionSummary, quick_summary, summarize_archive
+from .timing import TimingReport, audit_archive, read_timing_report
+
+
+def format_summary(summary: SessionSummary) -> str:
+    stats = summary.stats
+    medianRt = stats.get_median_reaction_time()
+    columns = [
+        str(summary.filename),
+        str(summary.date),
+        str(summary.startTime),
+        str(stats.nTrials),
+        *[str(stats.outcomeCounts[outcome]) for outcome in TrialOutcome],
+        f"{stats.totalRewardMS:.0f}",
+        "" if medianRt is None else f"{medianRt:.1f}",
+    ]
+    return "\t".join(columns)
+
+
+def summary_command(options: argparse.Namespace):
+    header = ["file", "date", "startTime", "nTrials", *[outcome.name for outcome in TrialOutcome]]
+    print("\t".join(header + ["rewardMS", "medianReactionTimeMS"]))
+    for path in options.paths:
+        if path.is_dir():
+            summaries = summarize_archive(path, pattern=options.pattern, workers=options.workers)
+        else:
+            summaries = [quick_summary(path)]
+        for summary in summaries:
+            print(format_summary(summary))
+
+
+def timing_command(options: argparse.Namespace):
+    names = [reportField.name for reportField in dataclasses.fields(TimingReport)]
+    print("\t".join(names))
+    for path in options.paths:
+        if path.is_dir():
+            reports = audit_archive(path, pattern=options.pattern, workers=options.workers)
+        else:
+            reports = [read_timing_report(path)]
+        for report in reports:
+            print("\t".join(f"{value:.4g}" if isinstance(value, float) else str(value) for value in vars(report).values()))
+
+
+def serve_command(options: argparse.Namespace):
+    if options.port is not None:
+        address = ("127.0.0.1", options.port)
+    elif options.socket is not None:
+        address = options.socket
+    else:
+        address = DefaultAddress
+    run_service(address, interval=options.interval)
+
+
+def main(args: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m readTDR", description="Tools for TDR files")
+    subparsers = parser.add_subparsers(required=True)
+
+    summaryParser = subparsers.add_parser(
+        "summary", help="print outcome counts, reward and reaction time per session (tab-separated)"
+    )
+    summaryParser.add_argument("paths", type=pathlib.Path, nargs="+", help="TDR files or directories")
+    summaryParser.add_argument("--pattern", default="**/*.tdr", help="glob pattern within directories")
+    summaryParser.add_argument("--workers", type=int, default=None, help="number of processes")
+    summaryParser.set_defaults(command=summary_command)
+
+    timingParser = subparsers.add_parser(
+        "timing", help="print interval timing and frame loss statistics per session (tab-separated)"
+    )
+    timingParser.add_argument("paths", type=pathlib.Path, nargs="+", help="TDR files or directories")
+    timingParser.add_argument("--pattern", default="**/*.tdr", help="glob pattern within directories")
+    timingParser.add_argument("--workers", type=int, default=None, help="number of processes")
+    timingParser.set_defaults(command=timing_command)
+
+    serveParser = subparsers.add_parser("serve", help="share parsed TDR files between processes")
+    serveAddress = serveParser.add_mutually_exclusive_group()
+    serveAddress.add_argument("--socket", type=pathlib.Path, default=None, help="Unix socket path")
+    serveAddress.add_argument("--port", type=int, default=None, help="loopback TCP port")
+    serveParser.add_argument("--interval", type=float, default=0.5, help="polling interval in seconds")
+    serveParser.set_defaults(command=serve_command)
+
+    options = parser.parse_args(args)
+    options.command(options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import functools
+import pathlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from .readTDR import TDR, TrialOutcome, map_archive, read_tdr_without_objects
+
+nOutcomes = len(TrialOutcome)
+
+# fixed edges of the reaction time histograms, so that aggregates of different
+# files can be merged; the last bin also counts longer reaction times
+ReactionTimeEdgesMS = np.arange(0.0, 2010.0, 10.0)
+
+# arrays of `ConditionAggregate` with the condition axes first
+ConditionArrayNames = [
+    "counts",
+    "trialDurationSumMS",
+    "reactionTimeCounts",
+    "reactionTimeSumMS",
+    "reactionTimeSumSqMS",
+    "reactionTimeMinMS",
+    "reactionTimeMaxMS",
+    "hitReactionTimeHistogram",
+]
+
+
+@dataclass
+class ConditionAggregate:
+    """Trial counts and summaries per stimulusNumber x timeSequence x outcome.
+
+    The first two axes of all arrays correspond to `stimulusNumbers` and
+    `timeSequences`, the third one (if any) to the `TrialOutcome` values.
+    Reaction times are only counted if they are > 0. Aggregates of different
+    sessions are combined with `merge`.
+    """
+
+    stimulusNumbers: np.ndarray
+    timeSequences: np.ndarray
+    # (nStimuli, nTimeSequences, nOutcomes)
+    counts: np.ndarray
+    trialDurationSumMS: np.ndarray
+    reactionTimeCounts: np.ndarray
+    reactionTimeSumMS: np.ndarray
+    reactionTimeSumSqMS: np.ndarray
+    # +inf / -inf where there is no reaction time
+    reactionTimeMinMS: np.ndarray
+    reactionTimeMaxMS: np.ndarray
+    # (nStimuli, nTimeSequences, len(ReactionTimeEdgesMS) - 1), hits only
+    hitReactionTimeHistogram: np.ndarray
+
+    @classmethod
+    def empty(cls, stimulusNumbers: np.ndarray, timeSequences: np.ndarray) -> "ConditionAggregate":
+        shape = (len(stimulusNumbers), len(timeSequences), nOutcomes)
+        return cls(
+            stimulusNumbers=np.asarray(stimulusNumbers, dtype="i4"),
+            timeSequences=np.asarray(timeSequences, dtype="i4"),
+            counts=np.zeros(shape, dtype="i8"),
+            trialDurationSumMS=np.zeros(shape),
+            reactionTimeCounts=np.zeros(shape, dtype="i8"),
+            reactionTimeSumMS=np.zeros(shape),
+            reactionTimeSumSqMS=np.zeros(shape),
+            reactionTimeMinMS=np.full(shape, np.inf),
+            reactionTimeMaxMS=np.full(shape, -np.inf),
+            hitReactionTimeHistogram=np.zeros(shape[:2] + (len(ReactionTimeEdgesMS) - 1,), dtype="i8"),
+        )
+
+    def reindex(self, stimulusNumbers: np.ndarray, timeSequences: np.ndarray) -> "ConditionAggregate":
+        """Returns the aggregate on larger condition axes that contain the current ones."""
+        result = ConditionAggregate.empty(stimulusNumbers, timeSequences)
+        index = np.ix_(
+            np.searchsorted(result.stimulusNumbers, self.stimulusNumbers),
+            np.searchsorted(result.timeSequences, self.timeSequences),
+        )
+        for name in ConditionArrayNames:
+            getattr(result, name)[index] = getattr(self, name)
+        return result
+
+    def merge(self, other: "ConditionAggregate") -> "ConditionAggregate":
+        """Returns the aggregate of the trials of both aggregates."""
+        stimulusNumbers = np.union1d(self.stimulusNumbers, other.stimulusNumbers)
+        timeSequences = np.union1d(self.timeSequences, other.timeSequences)
+        result = self.reindex(stimulusNumbers, timeSequences)
+        other = other.reindex(stimulusNumbers, timeSequences)
+        for name in ConditionArrayNames:
+            if name == "reactionTimeMinMS":
+                np.minimum(result.reactionTimeMinMS, other.reactionTimeMinMS, out=result.reactionTimeMinMS)
+            elif name == "reactionTimeMaxMS":
+                np.maximum(result.reactionTimeMaxMS, other.reactionTimeMaxMS, out=result.reactionTimeMaxMS)
+            else:
+                getattr(result, name)[...] += getattr(other, name)
+        return result
+
+    def get_hit_rate(self) -> np.ndarray:
+        """Returns hits / started trials per condition, NaN for conditions without started trials."""
+        started = self.counts.sum(axis=2) - self.counts[:, :, TrialOutcome.NotStarted.value]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.counts[:, :, TrialOutcome.Hit.value] / started
+
+    def get_mean_trial_duration(self) -> np.ndarray:
+        """Returns the mean trial duration per condition and outcome in ms."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.trialDurationSumMS / self.counts
+
+    def get_mean_reaction_time(self) -> np.ndarray:
+        """Returns the mean reaction time per condition and outcome in ms."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.reactionTimeSumMS / self.reactionTimeCounts
+
+    def get_std_reaction_time(self) -> np.ndarray:
+        """Returns the standard deviation of the reaction time per condition and outcome in ms."""
+        mean = self.get_mean_reaction_time()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = self.reactionTimeSumSqMS / self.reactionTimeCounts - mean**2
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    def get_hit_reaction_time_quantile(self, q: float) -> np.ndarray:
+        """Returns the `q` quantile of the reaction time of hits per condition in ms.
+
+        The quantile is interpolated linearly within the bins of
+        `hitReactionTimeHistogram` and limited to the range of the reaction
+        times of hits, NaN for conditions without hits.
+        """
+        cumulative = np.cumsum(self.hitReactionTimeHistogram, axis=2)
+        total = cumulative[:, :, -1]
+        rank = q * total
+        # the first bin reaching the rank, skipping leading empty bins for q = 0
+        below = (cumulative < rank[:, :, np.newaxis]) | (cumulative == 0)
+        iBin = np.minimum(below.sum(axis=2), cumulative.shape[2] - 1)
+        below = np.where(iBin > 0, np.take_along_axis(cumulative, (iBin - 1)[:, :, np.newaxis], 2)[:, :, 0], 0)
+        inBin = np.take_along_axis(self.hitReactionTimeHistogram, iBin[:, :, np.newaxis], 2)[:, :, 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.clip((rank - below) / inBin, 0.0, 1.0)
+        binWidth = np.diff(ReactionTimeEdgesMS)[iBin]
+        quantile = np.clip(
+            ReactionTimeEdgesMS[iBin] + fraction * binWidth,
+            self.reactionTimeMinMS[:, :, TrialOutcome.Hit.value],
+            self.reactionTimeMaxMS[:, :, TrialOutcome.Hit.value],
+        )
+        return np.where(total > 0, quantile, np.nan)
+
+
+def aggregate_trial_arrays(arrays: dict[str, np.ndarray]) -> ConditionAggregate:
+    """Aggregates trial columns as returned by `TDR.get_trial_arrays`."""
+    stimulusNumber, timeSequence = arrays["stimulusNumber"], arrays["timeSequence"]
+    result = ConditionAggregate.empty(np.unique(stimulusNumber), np.unique(timeSequence))
+    shape = result.counts.shape
+    size = result.counts.size
+
+    # one flat integer code per trial for stimulusNumber x timeSequence x outcome
+    condition = (
+        np.searchsorted(result.stimulusNumbers, stimulusNumber) * shape[1]
+        + np.searchsorted(result.timeSequences, timeSequence)
+    )
+    code = condition * nOutcomes + arrays["outcome"]
+    result.counts[...] = np.bincount(code, minlength=size).reshape(shape)
+    result.trialDurationSumMS[...] = np.bincount(code, arrays["trialDurationMS"], minlength=size).reshape(shape)
+
+    reactionTimeMS = arrays["reactionTimeMS"]
+    hasReactionTime = reactionTimeMS > 0.0
+    rtCode, rtMS = code[hasReactionTime], reactionTimeMS[hasReactionTime]
+    result.reactionTimeCounts[...] = np.bincount(rtCode, minlength=size).reshape(shape)
+    result.reactionTimeSumMS[...] = np.bincount(rtCode, rtMS, minlength=size).reshape(shape)
+    result.reactionTimeSumSqMS[...] = np.bincount(rtCode, rtMS**2, minlength=size).reshape(shape)
+
+    # minimum and maximum over the segments of the sorted codes
+    if rtCode.size:
+        order = np.argsort(rtCode, kind="stable")
+        sortedCode, sortedMS = rtCode[order], rtMS[order]
+        segmentStarts = np.flatnonzero(np.diff(sortedCode, prepend=-1))
+        segmentCodes = sortedCode[segmentStarts]
+        result.reactionTimeMinMS.flat[segmentCodes] = np.minimum.reduceat(sortedMS, segmentStarts)
+        result.reactionTimeMaxMS.flat[segmentCodes] = np.maximum.reduceat(sortedMS, segmentStarts)
+
+    isHit = hasReactionTime & (arrays["outcome"] == TrialOutcome.Hit.value)
+    nBins = len(ReactionTimeEdgesMS) - 1
+    iBin = np.clip(np.searchsorted(ReactionTimeEdgesMS, reactionTimeMS[isHit], side="right") - 1, 0, nBins - 1)
+    result.hitReactionTimeHistogram[...] = np.bincount(
+        condition[isHit] * nBins + iBin, minlength=shape[0] * shape[1] * nBins
+    ).reshape(shape[:2] + (nBins,))
+    return result
+
+
+def aggregate_tdr(tdr: TDR) -> ConditionAggregate:
+    return aggregate_trial_arrays(tdr.get_trial_arrays())
+
+
+def aggregate_file(filename: pathlib.Path) -> ConditionAggregate:
+    """Returns the aggregate of a TDR file, skipping its stimulus objects."""
+    return aggregate_tdr(read_tdr_without_objects(filename))
+
+
+def aggregate_archive(directory: pathlib.Path, pattern: str = "**/*.tdr", workers: int = None) -> ConditionAggregate:
+    """Returns the merged aggregate of all TDR files in `directory` matching `pattern`.
+
+    The files are aggregated in parallel, see `map_archive`.
+    """
+    aggregates = map_archive(aggregate_file, directory, pattern=pattern, workers=workers)
+    return functools.reduce(ConditionAggregate.merge, aggregates, ConditionAggregate.empty([], []))
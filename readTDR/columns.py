@@ -0,0 +1,54 @@
+import numpy as np
+
+from .readTDR import Trial
+
+# per-trial scalar fields and their dtype, enums are stored as their value
+TrialColumnDtypes = {
+    "trialNumber": np.dtype("i4"),
+    "stimulusNumber": np.dtype("i4"),
+    "timeSequence": np.dtype("i4"),
+    "wasPerfectMonkey": np.dtype("?"),
+    "wasHit": np.dtype("?"),
+    "outcome": np.dtype("i1"),
+    "manipulandum": np.dtype("i1"),
+    "wasPreciseFixation": np.dtype("?"),
+    "reactionTimeMS": np.dtype("f8"),
+    "rewardDurationMS": np.dtype("f8"),
+    "lastInterval": np.dtype("i4"),
+    "eyeControlFlag": np.dtype("?"),
+    "intervalOfFrameLoss": np.dtype("i4"),
+    "timeOfFrameLoss": np.dtype("f8"),
+    "tRelTrialStartMIN": np.dtype("f8"),
+    "trialDurationMS": np.dtype("f8"),
+}
+
+
+def get_trial_values(trial: Trial) -> dict:
+    """Returns the values of the trial columns of a single trial."""
+    return {
+        "trialNumber": trial.trialNumber,
+        "stimulusNumber": trial.stimulusNumber,
+        "timeSequence": trial.timeSequence,
+        "wasPerfectMonkey": trial.wasPerfectMonkey,
+        "wasHit": trial.wasHit,
+        "outcome": trial.outcome.value,
+        "manipulandum": trial.manipulandum.value,
+        "wasPreciseFixation": trial.wasPreciseFixation,
+        "reactionTimeMS": trial.reactionTimeMS,
+        "rewardDurationMS": trial.rewardDurationMS,
+        "lastInterval": trial.lastInterval,
+        "eyeControlFlag": trial.eyeControlFlag,
+        "intervalOfFrameLoss": trial.intervalOfFrameLoss,
+        "timeOfFrameLoss": trial.timeOfFrameLoss,
+        "tRelTrialStartMIN": trial.tRelTrialStartMIN,
+        "trialDurationMS": trial.get_trial_duration(),
+    }
+
+
+def build_trial_arrays(trials: list[Trial]) -> dict[str, np.ndarray]:
+    """Returns the scalar fields of all trials as one array per column."""
+    values = [get_trial_values(trial) for trial in trials]
+    return {
+        name: np.array([trialValues[name] for trialValues in values], dtype=dtype)
+        for name, dtype in TrialColumnDtypes.items()
+    }
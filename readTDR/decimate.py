@@ -0,0 +1,104 @@
+"""Level-of-detail decimation of long data series for plotting.
+
+Only depends on NumPy, so that plotTDR can import it when run as a script.
+"""
+
+import numpy as np
+
+
+def get_m4_indices(x: np.ndarray, y: np.ndarray, xmin: float, xmax: float, nBins: int) -> np.ndarray:
+    """Returns the indices of the points to draw for x sorted in ascending order.
+
+    The range [xmin, xmax] is divided into `nBins` bins (e.g. one per pixel
+    column) and for each bin the first, last, minimum and maximum point is kept,
+    which gives the same image as drawing all points. The nearest point outside
+    the range on either side is kept as well, so that lines continue to the
+    edge of the axes.
+    """
+    iStart = max(np.searchsorted(x, xmin, side="left") - 1, 0)
+    iStop = min(np.searchsorted(x, xmax, side="right") + 1, len(x))
+    if iStop - iStart <= 4 * nBins or xmax <= xmin:
+        return np.arange(iStart, iStop)
+
+    xVisible = x[iStart:iStop]
+    yVisible = y[iStart:iStop]
+    bins = np.clip(np.floor((xVisible - xmin) / (xmax - xmin) * nBins).astype(int), -1, nBins)
+
+    # sort by bin and y within each bin, the first and last entry of each bin
+    # are then its minimum and maximum
+    order = np.lexsort((yVisible, bins))
+    binStarts = np.flatnonzero(np.diff(bins[order], prepend=bins[order][0] - 1))
+    binEnds = np.append(binStarts[1:], order.size) - 1
+    minMax = np.concatenate([order[binStarts], order[binEnds]])
+
+    # x is sorted, so the first and last point of each bin in x order are at
+    # the changes of the bin index
+    firstLast = np.flatnonzero(np.diff(bins, prepend=bins[0] - 1, append=bins[-1] + 1))
+    firstLast = np.concatenate([firstLast[:-1], firstLast[1:] - 1])
+
+    return iStart + np.unique(np.concatenate([minMax, firstLast]))
+
+
+def get_grid_indices(
+    x: np.ndarray, y: np.ndarray, xlim: tuple[float, float], ylim: tuple[float, float], nBins: tuple[int, int]
+) -> np.ndarray:
+    """Returns the indices of the points to draw as markers.
+
+    The visible area is divided into a grid of `nBins` = (nX, nY) cells (e.g.
+    one per pixel) and one point is kept per occupied cell. Points outside of
+    the area are dropped.
+    """
+    (xmin, xmax), (ymin, ymax) = xlim, ylim
+    nX, nY = nBins
+    visible = np.flatnonzero((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))
+    if visible.size <= nX or xmax <= xmin or ymax <= ymin:
+        return visible
+
+    iX = np.minimum(((x[visible] - xmin) / (xmax - xmin) * nX).astype(int), nX - 1)
+    iY = np.minimum(((y[visible] - ymin) / (ymax - ymin) * nY).astype(int), nY - 1)
+    _, iFirst = np.unique(iX.astype(np.int64) * nY + iY, return_index=True)
+    return visible[np.sort(iFirst)]
+
+
+class DecimatedLine:
+    """Keeps the full data of a matplotlib Line2D and draws only a decimated part.
+
+    Lines are decimated with `get_m4_indices`, lines drawn with markers only
+    (linestyle "none") with `get_grid_indices`. The data is decimated again for
+    the visible range whenever the limits of the axes change, e.g. when
+    zooming or panning. The object stays alive with the axes, there is no need
+    to keep a reference to it.
+    """
+
+    def __init__(self, line, x, y):
+        self.line = line
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        order = np.argsort(self.x, kind="stable")
+        self.x, self.y = self.x[order], self.y[order]
+        self.isScatter = line.get_linestyle() in ("None", "none", "", " ")
+
+        axes = line.axes
+        if self.x.size:
+            self.update((self.x[0], self.x[-1]), (self.y.min(), self.y.max()), axes.bbox.width, axes.bbox.height)
+        # the callback registry only keeps weak references to bound methods, so
+        # connect a function that keeps this object alive as long as the axes
+        def on_lim_changed(axes):
+            self.on_lim_changed(axes)
+
+        axes.callbacks.connect("xlim_changed", on_lim_changed)
+        if self.isScatter:
+            axes.callbacks.connect("ylim_changed", on_lim_changed)
+
+    def update(self, xlim: tuple[float, float], ylim: tuple[float, float], width: float, height: float):
+        if self.x.size == 0:
+            return
+        nX, nY = max(int(width), 1), max(int(height), 1)
+        if self.isScatter:
+            indices = get_grid_indices(self.x, self.y, xlim, ylim, (nX, nY))
+        else:
+            indices = get_m4_indices(self.x, self.y, xlim[0], xlim[1], nX)
+        self.line.set_data(self.x[indices], self.y[indices])
+
+    def on_lim_changed(self, axes):
+        self.update(axes.get_xlim(), axes.get_ylim(), axes.bbox.width, axes.bbox.height)
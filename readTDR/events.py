@@ -0,0 +1,150 @@
+from enum import Enum
+
+import numpy as np
+
+from .readTDR import FixationPoint1, Trial, nIntervals
+
+
+class EventCode(Enum):
+    PositiveTriggerTransition = 1
+    NegativeTriggerTransition = 2
+    StartStopSignal = 3
+    FixationPointAppearance = 4
+    FixationPointDisappearance = 5
+
+
+EventDtype = np.dtype(
+    [
+        # time since start of the session in milliseconds
+        ("tMS", "f8"),
+        # index of the trial in TDR.get_trials()
+        ("iTrial", "i4"),
+        # EventCode value
+        ("code", "i1"),
+        # interval in which the event occurred, -1 if outside of all intervals
+        ("interval", "i2"),
+        # StartResponseSignalCode value for StartStopSignal, object number for
+        # fixation point events, 0 otherwise
+        ("value", "i4"),
+    ]
+)
+
+
+def find_sorted(tStart: np.ndarray, tEnd: np.ndarray, labels: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Returns the label of the span [tStart, tEnd) containing each `t`, or -1.
+
+    The spans must be sorted by `tStart` and must not overlap.
+    """
+    t = np.asarray(t)
+    if tStart.size == 0:
+        return np.full(t.shape, -1)
+    i = np.searchsorted(tStart, t, side="right") - 1
+    iSpan = np.maximum(i, 0)
+    return np.where((i >= 0) & (t < tEnd[iSpan]), labels[iSpan], -1)
+
+
+def build_event_table(trials: list[Trial]) -> np.recarray:
+    """Returns the events of all trials as a record array sorted by time.
+
+    Trigger transitions are taken from the first `nIntervals` entries of $TS1,
+    negative times mark unused entries and are skipped.
+    """
+    tables = []
+    for iTrial, trial in enumerate(trials):
+        tStartMS = trial.tRelTrialStartMIN * 60.0 * 1000.0
+        tRise = np.asarray(trial.tPositiveTriggerTransitionMS[:nIntervals])
+        tFall = np.asarray(trial.tNegativeTriggerTransitionMS[:nIntervals])
+        intervals = np.flatnonzero((tRise >= 0.0) & (tFall >= 0.0))
+
+        times = [tRise[intervals], tFall[intervals]]
+        codes = [
+            np.full(intervals.size, EventCode.PositiveTriggerTransition.value),
+            np.full(intervals.size, EventCode.NegativeTriggerTransition.value),
+        ]
+        eventIntervals = [intervals, intervals]
+        values = [np.zeros(intervals.size), np.zeros(intervals.size)]
+
+        # start/stop signals occur relative to the begin of their interval
+        signals = [signal for signal in trial.signals if signal.interval in intervals]
+        times.append(np.array([tRise[signal.interval] + signal.tOccurrenceMS for signal in signals]))
+        codes.append(np.full(len(signals), EventCode.StartStopSignal.value))
+        eventIntervals.append(np.array([signal.interval for signal in signals]))
+        values.append(np.array([signal.type.value for signal in signals]))
+
+        for stimulusObject in trial.stimulusObjects:
+            for subheader in stimulusObject.subheaders:
+                if not isinstance(subheader, FixationPoint1):
+                    continue
+                for tObject, code in [
+                    (subheader.tAppearanceMS, EventCode.FixationPointAppearance),
+                    (subheader.tDisappearanceMS, EventCode.FixationPointDisappearance),
+                ]:
+                    tObject = np.asarray(tObject)
+                    tObject = tObject[tObject >= 0.0]
+                    times.append(tObject)
+                    codes.append(np.full(tObject.size, code.value))
+                    eventIntervals.append(find_sorted(tRise[intervals], tFall[intervals], intervals, tObject))
+                    values.append(np.full(tObject.size, stimulusObject.objectNumber))
+
+        table = np.empty(sum(t.size for t in times), dtype=EventDtype)
+        table["tMS"] = tStartMS + np.concatenate(times)
+        table["iTrial"] = iTrial
+        table["code"] = np.concatenate(codes)
+        table["interval"] = np.concatenate(eventIntervals)
+        table["value"] = np.concatenate(values)
+        tables.append(table)
+
+    table = np.concatenate(tables) if tables else np.empty(0, dtype=EventDtype)
+    table = table[np.lexsort((table["code"], table["tMS"]))]
+    return table.view(np.recarray)
+
+
+def get_interval_bounds(eventTable: np.ndarray) -> np.recarray:
+    """Returns start and end (ms) of all intervals in `eventTable`, sorted by start."""
+    rises = eventTable[eventTable["code"] == EventCode.PositiveTriggerTransition.value]
+    falls = eventTable[eventTable["code"] == EventCode.NegativeTriggerTransition.value]
+    _, iRise, iFall = np.intersect1d(
+        rises["iTrial"].astype("i8") * nIntervals + rises["interval"],
+        falls["iTrial"].astype("i8") * nIntervals + falls["interval"],
+        assume_unique=True,
+        return_indices=True,
+    )
+    bounds = np.empty(iRise.size, dtype=[("tStartMS", "f8"), ("tEndMS", "f8"), ("iTrial", "i4"), ("interval", "i2")])
+    bounds["tStartMS"] = rises["tMS"][iRise]
+    bounds["tEndMS"] = falls["tMS"][iFall]
+    bounds["iTrial"] = rises["iTrial"][iRise]
+    bounds["interval"] = rises["interval"][iRise]
+    return bounds[np.argsort(bounds["tStartMS"], kind="stable")].view(np.recarray)
+
+
+def find_trials(eventTable: np.ndarray, tMS: np.ndarray) -> np.ndarray:
+    """Returns for each time `tMS` (ms since session start) the index of the trial
+    it falls into, or -1.
+
+    A trial spans from its first to its last trigger transition.
+    """
+    bounds = get_interval_bounds(eventTable)
+    nTrials = int(eventTable["iTrial"].max()) + 1 if eventTable.size else 0
+    tStart = np.full(nTrials, np.inf)
+    tEnd = np.full(nTrials, -np.inf)
+    np.minimum.at(tStart, bounds["iTrial"], bounds["tStartMS"])
+    np.maximum.at(tEnd, bounds["iTrial"], bounds["tEndMS"])
+
+    trials = np.flatnonzero(np.isfinite(tStart))
+    trials = trials[np.argsort(tStart[trials], kind="stable")]
+    return find_sorted(tStart[trials], tEnd[trials], trials, tMS)
+
+
+def find_intervals(eventTable: np.ndarray, tMS: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Returns for each time `tMS` (ms since session start) the index of the trial
+    and the interval it falls into, both -1 if it is outside of all intervals.
+    """
+    bounds = get_interval_bounds(eventTable)
+    if bounds.size == 0:
+        return np.full(np.shape(tMS), -1), np.full(np.shape(tMS), -1)
+    iBound = find_sorted(bounds["tStartMS"], bounds["tEndMS"], np.arange(bounds.size), tMS)
+    found = iBound >= 0
+    return (
+        np.where(found, bounds["iTrial"][iBound], -1),
+        np.where(found, bounds["interval"][iBound], -1),
+    )
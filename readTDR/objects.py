@@ -0,0 +1,97 @@
+import dataclasses
+import typing
+
+import numpy as np
+
+from .readTDR import Header, Trial
+
+ObjectHeaderFields = ["show", "xPos", "yPos", "zPos", "rotX", "rotY", "rotZ"]
+
+
+def get_numeric_fields(subheader: Header) -> list[str]:
+    """Returns the names of the fields of `subheader` holding a number or a list of numbers."""
+    names = []
+    for subheaderField in dataclasses.fields(subheader):
+        if subheaderField.name in Header.__dataclass_fields__:
+            continue
+        fieldType = subheaderField.type
+        if typing.get_origin(fieldType) is list:
+            fieldType = typing.get_args(fieldType)[0]
+        if fieldType in (bool, int, float):
+            names.append(subheaderField.name)
+    return names
+
+
+def build_object_arrays(trials: list[Trial]) -> dict[str, np.ndarray]:
+    """Returns the stimulus objects of all trials as dense arrays.
+
+    The columns are the sorted object numbers of all trials. The returned dict
+    contains
+      - "objectNumber", "typeName": (nObjects,) object number and type per column
+      - "present": (nTrials, nObjects) whether the object exists in the trial
+      - "show", "xPos", "yPos", "zPos", "rotX", "rotY", "rotZ": (nTrials, nObjects)
+        fields of the $OH1 header, NaN where the object is not present
+      - one array per field of the typed $OS1 subheaders (see
+        `ObjectTypeNameMap`), (nTrials, nObjects) for scalar fields and
+        (nTrials, nObjects, n) for lists of numbers, NaN where not available.
+
+    For example, `arrays["xPos"][:, list(arrays["objectNumber"]).index(3)]` is
+    the x position of object 3 in every trial.
+    """
+    objectNumbers = sorted(
+        {stimulusObject.objectNumber for trial in trials for stimulusObject in trial.stimulusObjects}
+    )
+    columns = {objectNumber: iColumn for iColumn, objectNumber in enumerate(objectNumbers)}
+    shape = (len(trials), len(objectNumbers))
+
+    typeNames = [""] * len(objectNumbers)
+    rows: list[int] = []
+    cols: list[int] = []
+    headerValues: dict[str, list] = {name: [] for name in ObjectHeaderFields}
+
+    # (row, column, value) of the numeric fields of the subheaders
+    subheaderValues: dict[str, tuple[list[int], list[int], list]] = {}
+    fieldNames: dict[type, list[str]] = {}
+    for iTrial, trial in enumerate(trials):
+        for stimulusObject in trial.stimulusObjects:
+            iColumn = columns[stimulusObject.objectNumber]
+            typeNames[iColumn] = typeNames[iColumn] or stimulusObject.typeName
+            rows.append(iTrial)
+            cols.append(iColumn)
+            for name in ObjectHeaderFields:
+                headerValues[name].append(getattr(stimulusObject, name))
+            for subheader in stimulusObject.subheaders:
+                if type(subheader) not in fieldNames:
+                    fieldNames[type(subheader)] = get_numeric_fields(subheader)
+                for name in fieldNames[type(subheader)]:
+                    fieldRows, fieldCols, values = subheaderValues.setdefault(name, ([], [], []))
+                    fieldRows.append(iTrial)
+                    fieldCols.append(iColumn)
+                    values.append(getattr(subheader, name))
+
+    arrays: dict[str, np.ndarray] = {}
+    for name, values in headerValues.items():
+        arrays[name] = np.full(shape, np.nan)
+        arrays[name][rows, cols] = values
+
+    for name, (fieldRows, fieldCols, values) in subheaderValues.items():
+        if values and isinstance(values[0], list):
+            lengths = np.array([len(value) for value in values])
+            fieldRows = np.array(fieldRows)
+            fieldCols = np.array(fieldCols)
+            array = np.full(shape + (lengths.max(),), np.nan)
+            # assign lists of equal length at once
+            for length in np.unique(lengths):
+                iValues = np.flatnonzero(lengths == length)
+                array[fieldRows[iValues], fieldCols[iValues], :length] = [values[i] for i in iValues]
+        else:
+            array = np.full(shape, np.nan)
+            array[fieldRows, fieldCols] = values
+        arrays[name] = array
+
+    present = np.zeros(shape, dtype=bool)
+    present[rows, cols] = True
+    arrays["objectNumber"] = np.array(objectNumbers, dtype=int)
+    arrays["typeName"] = np.array(typeNames, dtype=str)
+    arrays["present"] = present
+    return arrays
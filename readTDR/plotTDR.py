@@ -1,4 +1,7 @@
+import os
+import queue
 import sys
+import threading
 import time
 import tkinter as tk
 from tkinter import filedialog
@@ -9,11 +12,18 @@ import matplotlib.dates as md
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from dataclasses import dataclass
 from matplotlib import gridspec
 
 import readTDR
 from readTDR import TrialOutcome
 
+try:
+    from readTDR.decimate import DecimatedLine
+except ImportError:
+    # run as a script, `readTDR` is the readTDR.py module next to this file
+    from decimate import DecimatedLine
+
 # colors
 from enum import Enum
 class Color(Enum):
@@ -66,11 +76,117 @@ matplotlib.use("TKAgg")
 plt.ioff()
 
 
-def plot_tdr(tdr: readTDR.TDR, fig=None):
+@dataclass(frozen=True)
+class Snapshot:
+    """Everything needed for plotting a TDR file, not modified after creation."""
+
+    filename: str
+    trials: tuple[readTDR.Trial, ...]
+    df: pd.DataFrame
+    outcomeCounts: dict[str, int]
+    totalRewardMS: float
+
+
+def make_snapshot(tdr: readTDR.TDR) -> Snapshot:
+    # plotTDR is run as a script, where `readTDR` is the readTDR.py module
+    # rather than the package, so only the API of readTDR.py is used here
     df = tdr.get_trials_as_dataframe()
     df.set_index("tAbsTrialStart", inplace=True)
     df.index = pd.to_datetime(df.index)
     trials = tdr.get_trials()
+    outcomeCounts = {outcome.name: 0 for outcome in TrialOutcome}
+    for trial in trials:
+        outcomeCounts[trial.outcome.name] += 1
+    return Snapshot(
+        filename=str(tdr.filename),
+        trials=tuple(trials),
+        df=df,
+        outcomeCounts=outcomeCounts,
+        totalRewardMS=sum(trial.rewardDurationMS for trial in trials if trial.outcome == TrialOutcome.Hit),
+    )
+
+
+@dataclass(frozen=True)
+class ParseFailure:
+    """Error of the last attempt to read the file, the last snapshot stays valid."""
+
+    filename: str
+    message: str
+
+
+def parse_worker(filename: str, snapshots: queue.Queue, stop: threading.Event):
+    """Parses the file whenever it changes and puts the newest snapshot into `snapshots`.
+
+    If the file cannot be read, e.g. while VStim is writing a line or while the
+    file is missing, a `ParseFailure` is put instead and the file is read again
+    once it changes. A failure does not replace a snapshot that has not been
+    plotted yet, it is put after it.
+    """
+    lastFileState = None
+    lastFailure = None
+    pending = None
+    while not stop.is_set():
+        result = failure = None
+        try:
+            stat = os.stat(filename)
+        except OSError as error:
+            # read the file again once it is back
+            lastFileState = None
+            failure = ParseFailure(filename=filename, message=f"{type(error).__name__}: {error}")
+        else:
+            if (stat.st_size, stat.st_mtime_ns) != lastFileState:
+                lastFileState = (stat.st_size, stat.st_mtime_ns)
+                try:
+                    # not read_tdr, which pauses the garbage collector of the
+                    # whole process including the Tk thread
+                    with open(filename, "r") as file:
+                        tdr = readTDR.TDR(filename=filename, headers=readTDR.parse_tdr_lines(file.readlines()))
+                    result = make_snapshot(tdr)
+                except Exception as error:
+                    failure = ParseFailure(filename=filename, message=f"{type(error).__name__}: {error}")
+
+        if failure is not None:
+            # report each failure once
+            if failure != lastFailure:
+                result = failure
+            lastFailure = failure
+        elif result is not None:
+            lastFailure = None
+
+        if result is not None:
+            pending = result
+        if pending is not None:
+            # replace a result that has not been plotted yet, unless a failure
+            # would replace a snapshot
+            try:
+                queued = snapshots.get_nowait()
+            except queue.Empty:
+                queued = None
+            if isinstance(pending, ParseFailure) and isinstance(queued, Snapshot):
+                snapshots.put(queued)
+            else:
+                snapshots.put(pending)
+                pending = None
+        stop.wait(1)
+
+
+def show_failure(failure: ParseFailure, fig):
+    """Shows the error on top of the last plot and returns the text artist."""
+    return fig.text(
+        0.5,
+        0.99,
+        f"Could not read {failure.filename} ({failure.message}), showing the last successful read",
+        ha="center",
+        va="top",
+        fontsize=8,
+        color=Color.RED.value,
+    )
+
+
+def plot_tdr(snapshot: Snapshot, fig=None):
+    df = snapshot.df
+    trials = snapshot.trials
+    hits = [trial for trial in trials if trial.outcome == TrialOutcome.Hit]
 
     # fig = plt.Figure()
     if fig is None:
@@ -79,7 +195,7 @@ def plot_tdr(tdr: readTDR.TDR, fig=None):
     fig.clf()
 
     # add filename at top of figure
-    plt.figtext(0.5, 0.95, filename, ha="center", fontsize=10)
+    plt.figtext(0.5, 0.95, snapshot.filename, ha="center", fontsize=10)
 
     # subplot layout
     gs = gridspec.GridSpec(3, 2, height_ratios=[3, 1, 2])
@@ -94,19 +210,15 @@ def plot_tdr(tdr: readTDR.TDR, fig=None):
     ax3_reactionTime.clear()
     ax4_timing.clear()
 
-    # plot trial durations as dots agains time
+    # plot trial durations as dots agains time, only the points visible at the
+    # current zoom level are drawn
+    tTrialStart = md.date2num([pd.to_datetime(trial.tAbsTrialStart) for trial in trials])
+    trialDurations = np.array([trial.get_trial_duration() for trial in trials])
+    outcomes = np.array([trial.outcome for trial in trials])
     for outcome in readTDR.TrialOutcome:
-        ax1_trialDuration.plot(
-            [
-                pd.to_datetime(trial.tAbsTrialStart)
-                for trial in trials
-                if trial.outcome == outcome
-            ],
-            [
-                trial.get_trial_duration()
-                for trial in trials
-                if trial.outcome == outcome
-            ],
+        (line,) = ax1_trialDuration.plot(
+            [],
+            [],
             markeredgecolor=colors.get(outcome, None),
             markerfacecolor=colors.get(outcome, None),
             markersize=3,
@@ -114,28 +226,35 @@ def plot_tdr(tdr: readTDR.TDR, fig=None):
             linestyle="none",
             label=outcome.name,
         )
+        isOutcome = outcomes == outcome
+        DecimatedLine(line, tTrialStart[isOutcome], trialDurations[isOutcome])
+    ax1_trialDuration.xaxis_date()
+    ax1_trialDuration.relim()
+    ax1_trialDuration.autoscale_view()
 
     ax1_trialDuration.legend(fontsize="small", ncol=2, frameon=False)
     ax1_trialDuration.set_ylabel("trial duration [ms]")
 
     # add stimulus number to scatter plot
     ax1_stimulusNumber = ax1_trialDuration.twinx()
-    ax1_stimulusNumber.step(
-        [pd.to_datetime(trial.tAbsTrialStart) for trial in trials],
-        [trial.stimulusNumber for trial in trials],
+    (line,) = ax1_stimulusNumber.step(
+        [],
+        [],
         linewidth=0.5,
         color="k",
         alpha=0.5,
     )
+    DecimatedLine(line, tTrialStart, [trial.stimulusNumber for trial in trials])
+    ax1_stimulusNumber.relim()
+    ax1_stimulusNumber.autoscale_view()
     ax1_stimulusNumber.set_ylabel("stimulus number")
 
     # add text at bottom of figure with overall counts
     overallCountsStr = ""
-    for key, value in tdr.get_outcome_counts().items():
+    for key, value in snapshot.outcomeCounts.items():
         overallCountsStr += key + ": " + str(value) + " | "
 
-    totalRewardMS = sum([trial.rewardDurationMS for trial in tdr.get_hits()])
-    overallCountsStr += f"Reward = {totalRewardMS} ms"
+    overallCountsStr += f"Reward = {snapshot.totalRewardMS} ms"
     plt.figtext(0.95, 0.01, overallCountsStr, ha="right", fontsize=8)
 
     # add moving average of performance
@@ -157,7 +276,7 @@ def plot_tdr(tdr: readTDR.TDR, fig=None):
     ax2_performance.xaxis.set_major_formatter(md.DateFormatter("%H:%M"))
 
     # add reaction time histogram
-    rt = [trial.reactionTimeMS for trial in tdr.get_hits() if trial.reactionTimeMS>0.0]
+    rt = [trial.reactionTimeMS for trial in hits if trial.reactionTimeMS>0.0]
     avgRt = np.median(rt)
     ax3_reactionTime.hist(
         rt,
@@ -229,14 +348,35 @@ if __name__ == "__main__":
     mng.window.state("withdrawn")
     mng.window.title(filename)
 
-    while not finished and plt.fignum_exists(fig.number):
-        tdr = readTDR.read_tdr(filename)
-        plot_tdr(tdr, fig)
-        # maximize window
-        # fig.canvas.manager.window.state("zoomed")
-        fig.set_visible(True)
-        mng.window.state("zoomed")
-
-        plt.pause(15)
+    # parse in the background so that the window stays responsive
+    snapshots = queue.Queue(maxsize=1)
+    stopWorker = threading.Event()
+    worker = threading.Thread(target=parse_worker, args=(filename, snapshots, stopWorker), daemon=True)
+    worker.start()
 
+    failureText = None
+    while not finished and plt.fignum_exists(fig.number):
+        try:
+            result = snapshots.get_nowait()
+        except queue.Empty:
+            result = None
+
+        if isinstance(result, ParseFailure):
+            if failureText is not None:
+                failureText.remove()
+            failureText = show_failure(result, fig)
+        elif result is not None:
+            # clears the figure including a shown failure
+            plot_tdr(result, fig)
+            failureText = None
+
+        if result is not None:
+            # maximize window
+            # fig.canvas.manager.window.state("zoomed")
+            fig.set_visible(True)
+            mng.window.state("zoomed")
+
+        plt.pause(0.1)
+
+    stopWorker.set()
     sys.exit()
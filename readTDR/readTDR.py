@@ -1,9 +1,17 @@
 from enum import Enum
+import concurrent.futures
+import contextlib
+import gc
+import io
+import itertools
+import mmap
+import os
 import pathlib
 import abc
 import warnings
 from dataclasses import dataclass, field
 import datetime
+from collections.abc import Callable
 
 nIntervals = 20
 
@@ -266,8 +274,9 @@ class TrialHeader(Header):
         self.intervalOfFrameLoss = int(tokens[15])
         self.timeOfFrameLoss = float(tokens[16])
 
-        # process subheaders
-        lines = lines[1:]
+        self.from_subheader_lines(lines[1:])
+
+    def from_subheader_lines(self, lines: list[str]):
         self.subheaders = []
         for iLine, line in enumerate(lines):
             if not line.startswith("$"):
@@ -333,8 +342,15 @@ class ObjectHeader(Header):
             subheaderId, nLines, subheaderVersion = line.split()[:3]
             if not self.typeName in ObjectTypeNameMap.keys():
                 continue
+            subheaderType = ObjectTypeNameMap[self.typeName]
+            if int(subheaderVersion) != subheaderType.headerVersion:
+                warnings.warn(
+                    f"Unknown version {subheaderVersion} of {subheaderId} in {self.typeName} objects",
+                    category=UserWarning,
+                )
+                continue
             nLines = int(nLines)
-            subheader = ObjectTypeNameMap[self.typeName]()
+            subheader = subheaderType()
             subheader.from_lines(lines[iLine : iLine + nLines])
             self.subheaders.append(subheader)
 
@@ -361,8 +377,35 @@ class FixationPoint1(Header):
         self.tDisappearanceMS = [float(t) * 1000 for t in tokens[5::2]]
 
 
+@dataclass(kw_only=True)
+class MorphPDF1(Header):
+    # the meaning of the parameters is not documented in the TDR format, they
+    # are kept in the order of the file
+    id: str = "$OS1"
+    nLines: int = 1
+    headerVersion: int = 5
+    isActive: bool = None
+    # the 11 values after isActive
+    parameters: list[float] = None
+    # trailing (code, time) pairs of variable length
+    sequence: list[tuple[int, float]] = None
+
+    def from_lines(self, lines: list[str]):
+        tokens = lines[0].split()
+        id, nLines, version = tokens[0:3]
+
+        assert self.id == id
+        assert self.nLines == int(nLines)
+        assert self.headerVersion == int(version)
+
+        self.isActive = bool(int(tokens[3]))
+        self.parameters = [float(t) for t in tokens[4:15]]
+        self.sequence = [(int(code), float(t)) for code, t in zip(tokens[15::2], tokens[16::2])]
+
+
 ObjectTypeNameMap = {
     "Fixation Point 1": FixationPoint1,
+    "Morph PDF 1": MorphPDF1,
 }
 
 HeaderIdMap = {
@@ -519,6 +562,34 @@ class TDR:
             for outcome in TrialOutcome
         }
 
+    def get_trial_arrays(self):
+        """Returns the scalar fields of all trials as a dict of NumPy arrays.
+
+        See `readTDR.columns.TrialColumnDtypes` for the columns.
+        """
+        from .columns import build_trial_arrays
+
+        return build_trial_arrays(self.get_trials())
+
+    def get_event_table(self):
+        """Returns the events of all trials as a NumPy record array sorted by time.
+
+        See `readTDR.events.EventDtype` for the fields and `find_trials` and
+        `find_intervals` for mapping external timestamps to trials and intervals.
+        """
+        from .events import build_event_table
+
+        return build_event_table(self.get_trials())
+
+    def get_object_arrays(self):
+        """Returns the stimulus objects of all trials as dense NumPy arrays.
+
+        See `readTDR.objects.build_object_arrays` for the layout.
+        """
+        from .objects import build_object_arrays
+
+        return build_object_arrays(self.get_trials())
+
     def get_trials_as_dataframe(self):
         import pandas as pd
 
@@ -537,16 +608,63 @@ class TDR:
         return df
 
 
-def read_tdr(filename: pathlib.Path) -> TDR:
-    with open(filename, "r") as file:
-        lines: list[str] = file.readlines()
-
+@dataclass(kw_only=True)
+class TrialQuery:
+    """Selects trials by their $TH1 fields and start time.
+
+    Each field is a container of accepted values (e.g. a `range` for
+    `trialNumbers`), None accepts all values. `tRelTrialStartMIN` is a
+    `(start, stop)` interval in minutes since the start of the session.
+    """
+
+    outcomes: list[TrialOutcome] = None
+    stimulusNumbers: list[int] = None
+    timeSequences: list[int] = None
+    trialNumbers: list[int] = None
+    tRelTrialStartMIN: tuple[float, float] = None
+
+    @property
+    def needsStartTime(self) -> bool:
+        """Whether $TS1 has to be parsed before calling the query."""
+        return self.tRelTrialStartMIN is not None
+
+    def __call__(self, header: TrialHeader) -> bool:
+        if self.outcomes is not None and header.outcome not in self.outcomes:
+            return False
+        if self.stimulusNumbers is not None and header.stimulusNumber not in self.stimulusNumbers:
+            return False
+        if self.timeSequences is not None and header.timeSequence not in self.timeSequences:
+            return False
+        if self.trialNumbers is not None and header.trialNumber not in self.trialNumbers:
+            return False
+        if self.tRelTrialStartMIN is not None:
+            # trials without $TS1 have no start time
+            if header.subheader1 is None:
+                return False
+            start, stop = self.tRelTrialStartMIN
+            if not start <= header.subheader1.tRelTrialStartMIN < stop:
+                return False
+        return True
+
+
+def parse_tdr_lines(
+    lines: list[str],
+    where: Callable[[TrialHeader], bool] = None,
+    objectCache: dict[tuple[str, ...], ObjectHeader] = None,
+) -> list[Header]:
     headers: list[Header] = []
+    skipTrial = False
     for iLine, line in enumerate(lines):
-        # only handle start of headers
-        if not line.startswith("$"):
+        # only handle start of headers, object subheaders are handled within
+        # their object headers
+        if not line.startswith("$") or line.startswith("$OS"):
             continue
 
+        # everything up to the next trial belongs to a skipped trial
+        if skipTrial and not line.startswith(("$TH1", "$FH")):
+            continue
+        skipTrial = False
+
         line = remove_comment(line)
 
         headerId, nLines, headerVersion = line.split()[:3]
@@ -564,12 +682,182 @@ def read_tdr(filename: pathlib.Path) -> TDR:
             warnings.warn(f"Unknown header {headerId}", category=UserWarning)
             continue
 
+        if headerId == "$OH1" and objectCache is not None:
+            # objects with the same lines as an earlier one share its instance
+            key = tuple(lines[iLine : iLine + nLines])
+            if key not in objectCache:
+                objectCache[key] = ObjectHeader()
+                objectCache[key].from_lines(lines[iLine : iLine + nLines])
+            headers.append(objectCache[key])
+            continue
+
         header = HeaderIdMap[headerId]()
-        header.from_lines(lines[iLine : iLine + nLines])
+        if headerId == "$TH1" and where is not None:
+            # check the $TH1 fields, and the start time in $TS1 if needed,
+            # before parsing the remaining subheaders
+            header.from_lines(lines[iLine : iLine + 1])
+            subheaderLines = lines[iLine + 1 : iLine + nLines]
+            if getattr(where, "needsStartTime", True):
+                # $TS1 has a single line, find it by its id
+                subheader1Lines = [line for line in subheaderLines if line.startswith("$TS1")]
+                header.from_subheader_lines(subheader1Lines)
+                subheaderLines = [line for line in subheaderLines if not line.startswith("$TS1")]
+            if not where(header):
+                skipTrial = True
+                continue
+            header.from_subheader_lines(subheaderLines)
+        else:
+            header.from_lines(lines[iLine : iLine + nLines])
+
         headers.append(header)
 
-    return TDR(
-        headers=headers,
-        filename=filename,
-    )
+    return headers
+
+
+def decode_lines(data: bytes) -> list[str]:
+    """Splits bytes read from a TDR file into lines like `open(filename, "r").readlines()`."""
+    return io.TextIOWrapper(io.BytesIO(data)).readlines()
+
+
+def copy_header(header: Header) -> Header:
+    """Returns a copy of a header that shares no lists or subheaders with it."""
+    copy = object.__new__(type(header))
+    copy.__dict__ = header.__dict__.copy()
+    for name, value in copy.__dict__.items():
+        if isinstance(value, list):
+            if value and isinstance(value[0], Header):
+                copy.__dict__[name] = [copy_header(subheader) for subheader in value]
+            else:
+                copy.__dict__[name] = value.copy()
+    return copy
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """Pauses the cyclic garbage collector while many headers are built.
+
+    Headers do not form reference cycles, but every allocation counts towards
+    the next collection, which traverses all headers built so far.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_tdr_chunk(
+    filename: pathlib.Path, start: int, stop: int, where: Callable[[TrialHeader], bool] = None
+) -> tuple[list[Header], list[tuple[str, type]]]:
+    """Parses the bytes between `start` and `stop` of a TDR file.
+
+    Returns the headers and the warnings raised while parsing, so that they can
+    be re-raised when called in a worker process. Repeated objects are parsed
+    once and share their instance, which keeps the pickled result compact; see
+    `copy_header` to separate them.
+    """
+    with open(filename, "rb") as file:
+        file.seek(start)
+        data = file.read(stop - start)
+    lines = decode_lines(data)
+
+    with warnings.catch_warnings(record=True) as caught, paused_gc():
+        warnings.simplefilter("always")
+        headers = parse_tdr_lines(lines, where=where, objectCache={})
+    # unique warnings in order of occurrence
+    return headers, list(dict.fromkeys((str(warning.message), warning.category) for warning in caught))
+
+
+def find_trial_boundaries(filename: pathlib.Path, nChunks: int) -> list[int]:
+    """Returns byte offsets splitting a TDR file into `nChunks` ranges starting at $TH1 lines."""
+    if os.path.getsize(filename) == 0:
+        # mmap cannot map empty files
+        return [0, 0]
+    with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        boundaries = [0]
+        for iChunk in range(1, nChunks):
+            start = data.find(b"\n$TH1", max(len(data) * iChunk // nChunks, boundaries[-1]))
+            if start < 0:
+                break
+            boundaries.append(start + 1)
+        boundaries.append(len(data))
+    return boundaries
+
+
+def read_tdr_without_objects(filename: pathlib.Path) -> TDR:
+    """Reads a TDR file, skipping its stimulus objects ($OH and $OS lines)."""
+    with open(filename, "r") as file:
+        lines = [line for line in file if not line.startswith(("$OH", "$OS"))]
+    with paused_gc():
+        headers = parse_tdr_lines(lines)
+    return TDR(headers=headers, filename=filename)
+
+
+def map_archive(
+    function: Callable[[pathlib.Path], object],
+    directory: pathlib.Path,
+    pattern: str = "**/*.tdr",
+    workers: int = None,
+    chunksize: int = 4,
+) -> list:
+    """Returns `function(filename)` for all TDR files in `directory` matching `pattern`.
+
+    The files are distributed over a process pool with `workers` processes
+    (default: number of CPUs), so `function` must be picklable, e.g. a
+    module-level function. On Windows, call this from within an
+    `if __name__ == "__main__":` block.
+    """
+    filenames = sorted(pathlib.Path(directory).glob(pattern))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, filenames, chunksize=chunksize))
+
+
+def read_tdr(filename: pathlib.Path, where: Callable[[TrialHeader], bool] = None, workers: int = None) -> TDR:
+    """Reads a TDR file.
+
+    If `where` is given, only trials for which `where(header)` is True are read.
+    The predicate is called once per trial with the $TH1 fields and $TS1 parsed
+    (the other subheaders are None) and trials it rejects are skipped without
+    parsing their remaining subheaders and objects. If `where.needsStartTime`
+    is False, $TS1 is not parsed before the call either. See `TrialQuery` for a
+    predicate on common fields.
+
+    If `workers` > 1, the file is split at $TH1 lines into `workers` chunks that
+    are parsed in a process pool, giving the same headers as the serial path.
+    The workers parse each distinct object once and only the copies of repeated
+    objects are made in this process. `where` must be picklable then, e.g. a
+    `TrialQuery` or a module-level function. On Windows, call this from within
+    an `if __name__ == "__main__":` block.
+    """
+    if workers is not None and workers > 1:
+        boundaries = find_trial_boundaries(filename, workers)
+        headers: list[Header] = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor, paused_gc():
+            chunks = executor.map(
+                read_tdr_chunk,
+                itertools.repeat(filename),
+                boundaries[:-1],
+                boundaries[1:],
+                itertools.repeat(where),
+            )
+            seen: set[int] = set()
+            for chunkHeaders, chunkWarnings in chunks:
+                for header in chunkHeaders:
+                    if isinstance(header, ObjectHeader):
+                        if id(header) in seen:
+                            header = copy_header(header)
+                        else:
+                            seen.add(id(header))
+                    headers.append(header)
+                for message, category in chunkWarnings:
+                    warnings.warn(message, category=category)
+        return TDR(headers=headers, filename=filename)
+
+    with open(filename, "r") as file:
+        lines: list[str] = file.readlines()
 
+    with paused_gc():
+        headers = parse_tdr_lines(lines, where=where)
+    return TDR(headers=headers, filename=filename)
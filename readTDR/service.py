@@ -0,0 +1,348 @@
+"""Local service sharing the parsed trials of live TDR files between processes.
+
+The service watches TDR files on request and publishes their trial columns
+(see `readTDR.columns.TrialColumnDtypes`) in `multiprocessing.shared_memory`.
+Clients talk to it over a local socket with newline-delimited JSON: a client
+sends `{"watch": filename}` and receives a table description immediately and
+again whenever new trials have been appended. Clients map the shared memory
+read-only, so no trial data is copied or parsed twice. If watching a file fails,
+its subscribers receive `{"filename": ..., "error": ...}` and the file is
+released; the same happens when its last subscriber disconnects.
+
+The service listens on a Unix socket, or on a loopback TCP port where Unix
+sockets are not available (Windows) or if a port is given. Any local user can
+connect to the TCP port. Start the service with
+`python -m readTDR serve [--socket PATH | --port PORT]`.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import signal
+import socket
+import tempfile
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .columns import TrialColumnDtypes, get_trial_values
+from .watch import watch_tdr
+
+logger = logging.getLogger(__name__)
+
+# a Unix socket path or a (host, port) tuple for loopback TCP
+Address = pathlib.Path | tuple[str, int]
+
+DefaultSocketPath = pathlib.Path(tempfile.gettempdir()) / "readTDR.sock"
+DefaultPort = 47211
+DefaultAddress: Address = DefaultSocketPath if hasattr(socket, "AF_UNIX") else ("127.0.0.1", DefaultPort)
+
+# number of trials stored in the first 8 bytes of each shared memory block
+CountDtype = np.dtype("i8")
+
+
+def get_column_offsets(capacity: int) -> tuple[dict[str, int], int]:
+    """Returns the byte offset of each column and the total size for `capacity` trials."""
+    offsets = {}
+    offset = CountDtype.itemsize
+    for name, dtype in TrialColumnDtypes.items():
+        offsets[name] = offset
+        # keep columns 8-byte aligned
+        offset += -(-capacity * dtype.itemsize // 8) * 8
+    return offsets, offset
+
+
+def map_columns(buffer, capacity: int) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    offsets, _ = get_column_offsets(capacity)
+    count = np.ndarray((1,), dtype=CountDtype, buffer=buffer, offset=0)
+    columns = {
+        name: np.ndarray((capacity,), dtype=dtype, buffer=buffer, offset=offsets[name])
+        for name, dtype in TrialColumnDtypes.items()
+    }
+    return count, columns
+
+
+class PublishedTable:
+    """Trial columns of one TDR file in shared memory, written by the service."""
+
+    def __init__(self, filename: pathlib.Path, capacity: int = 1024):
+        self.filename = filename
+        self.allocate(capacity)
+
+    def allocate(self, capacity: int):
+        _, size = get_column_offsets(capacity)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        count, columns = map_columns(shm.buf, capacity)
+        count[0] = 0
+        if hasattr(self, "shm"):
+            # copy into the larger block, clients re-attach on the next notification
+            for name, column in columns.items():
+                column[: self.nTrials] = self.columns[name][: self.nTrials]
+            count[0] = self.nTrials
+            self.close()
+        self.shm, self.capacity, self.count, self.columns = shm, capacity, count, columns
+
+    @property
+    def nTrials(self) -> int:
+        return int(self.count[0])
+
+    def append(self, values: dict):
+        if self.nTrials == self.capacity:
+            self.allocate(2 * self.capacity)
+        iTrial = self.nTrials
+        for name, value in values.items():
+            self.columns[name][iTrial] = value
+        # publish the trial only after all columns are written
+        self.count[0] = iTrial + 1
+
+    def describe(self) -> dict:
+        return {
+            "filename": str(self.filename),
+            "shm": self.shm.name,
+            "capacity": self.capacity,
+            "nTrials": self.nTrials,
+        }
+
+    def close(self):
+        del self.count, self.columns
+        self.shm.close()
+        self.shm.unlink()
+
+
+class TDRService:
+    """Watches TDR files and publishes their trials to subscribed clients."""
+
+    def __init__(self, address: Address = DefaultAddress, interval: float = 0.5):
+        self.address = address if isinstance(address, tuple) else pathlib.Path(address)
+        self.interval = interval
+        self.tables: dict[pathlib.Path, PublishedTable] = {}
+        self.subscribers: dict[pathlib.Path, set[asyncio.StreamWriter]] = {}
+        self.tasks: dict[pathlib.Path, asyncio.Task] = {}
+
+    async def serve(self):
+        if isinstance(self.address, tuple):
+            server = await asyncio.start_server(self.handle_client, *self.address)
+        else:
+            self.address.unlink(missing_ok=True)
+            server = await asyncio.start_unix_server(self.handle_client, path=str(self.address))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for filename in list(self.tables):
+                self.release(filename)
+            if not isinstance(self.address, tuple):
+                self.address.unlink(missing_ok=True)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions = []
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                filename = pathlib.Path(request["watch"]).resolve()
+                if not filename.is_file():
+                    error = FileNotFoundError(f"No such file: {filename}")
+                    await self.send(writer, {"filename": str(filename), "error": repr(error)})
+                    continue
+                if filename not in self.tables:
+                    self.tables[filename] = PublishedTable(filename)
+                    self.subscribers[filename] = set()
+                    self.tasks[filename] = asyncio.create_task(self.publish(filename))
+                    self.tasks[filename].add_done_callback(self.on_publish_done)
+                self.subscribers[filename].add(writer)
+                subscriptions.append(filename)
+                await self.send(writer, self.tables[filename].describe())
+        except (ConnectionError, json.JSONDecodeError, KeyError):
+            pass
+        finally:
+            for filename in subscriptions:
+                if filename in self.subscribers:
+                    self.subscribers[filename].discard(writer)
+                    if not self.subscribers[filename]:
+                        self.release(filename)
+            writer.close()
+
+    def release(self, filename: pathlib.Path):
+        """Stops watching `filename` and frees its shared memory."""
+        task = self.tasks.pop(filename)
+        task.cancel()
+        self.tables.pop(filename).close()
+        del self.subscribers[filename]
+
+    def on_publish_done(self, task: asyncio.Task):
+        filename = next((filename for filename, t in self.tasks.items() if t is task), None)
+        if filename is None or task.cancelled():
+            # released already
+            return
+        error = task.exception()
+        logger.error("Stopped watching %s", filename, exc_info=error)
+        message = json.dumps({"filename": str(filename), "error": repr(error)}).encode() + b"\n"
+        for writer in self.subscribers[filename]:
+            writer.write(message)
+        self.release(filename)
+
+    async def publish(self, filename: pathlib.Path):
+        table = self.tables[filename]
+        changed = asyncio.Event()
+        notifier = asyncio.create_task(self.notify(filename, changed))
+        try:
+            async for trial in watch_tdr(filename, interval=self.interval):
+                table.append(get_trial_values(trial))
+                # trials read at once are yielded without suspending, so the
+                # notifier only runs once per batch
+                changed.set()
+        finally:
+            notifier.cancel()
+
+    async def notify(self, filename: pathlib.Path, changed: asyncio.Event):
+        while True:
+            await changed.wait()
+            changed.clear()
+            for writer in list(self.subscribers[filename]):
+                await self.send(writer, self.tables[filename].describe())
+
+    async def send(self, writer: asyncio.StreamWriter, message: dict):
+        try:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(writer)
+
+
+class SharedTrialTable:
+    """Read-only view of the trial columns of a TDR file published by `TDRService`."""
+
+    def __init__(self, description: dict):
+        self.filename = pathlib.Path(description["filename"])
+        self.shm = None
+        self.update(description)
+
+    def update(self, description: dict):
+        if self.shm is None or self.shm.name != description["shm"]:
+            shm = shared_memory.SharedMemory(name=description["shm"])
+            if os.name == "posix":
+                # the service owns the block, do not unlink it when this process exits
+                resource_tracker.unregister(shm._name, "shared_memory")
+            if self.shm is not None:
+                self.close()
+            self.shm = shm
+            self.count, columns = map_columns(self.shm.buf, description["capacity"])
+            self.count.flags.writeable = False
+            for column in columns.values():
+                column.flags.writeable = False
+            self._columns = columns
+
+    @property
+    def nTrials(self) -> int:
+        return int(self.count[0])
+
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        """Zero-copy, read-only arrays of the trials published so far."""
+        nTrials = self.nTrials
+        return {name: column[:nTrials] for name, column in self._columns.items()}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name][: self.nTrials]
+
+    def close(self):
+        del self.count, self._columns
+        try:
+            self.shm.close()
+        except BufferError:
+            # arrays handed out by `columns` are still alive, the block is
+            # unmapped once they are garbage collected
+            pass
+        self.shm = None
+
+
+class TDRClient:
+    """Connects to a running `TDRService`."""
+
+    def __init__(self, address: Address = DefaultAddress):
+        if isinstance(address, tuple):
+            self.socket = socket.create_connection(address)
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(str(address))
+        self.buffer = b""
+        self.tables: dict[pathlib.Path, SharedTrialTable] = {}
+
+    def watch(self, filename: pathlib.Path) -> SharedTrialTable:
+        """Subscribes to `filename` and returns its shared trial table.
+
+        Raises RuntimeError if the service cannot watch the file.
+        """
+        # relative to the working directory of the client, not of the service
+        filename = pathlib.Path(filename).resolve()
+        self.socket.sendall(json.dumps({"watch": str(filename)}).encode() + b"\n")
+        while filename not in self.tables:
+            self.wait()
+        return self.tables[filename]
+
+    def wait(self, timeout: float = None) -> SharedTrialTable:
+        """Blocks until new trials are published and returns the updated table.
+
+        Returns None if `timeout` seconds pass without notification. Raises
+        RuntimeError if the service stopped watching the file.
+        """
+        self.socket.settimeout(timeout)
+        try:
+            while True:
+                while b"\n" not in self.buffer:
+                    data = self.socket.recv(65536)
+                    if not data:
+                        raise ConnectionError("TDR service closed the connection")
+                    self.buffer += data
+                line, self.buffer = self.buffer.split(b"\n", 1)
+
+                description = json.loads(line)
+                filename = pathlib.Path(description["filename"])
+                if "error" in description:
+                    if filename in self.tables:
+                        self.tables.pop(filename).close()
+                    raise RuntimeError(f"TDR service stopped watching {filename}: {description['error']}")
+                try:
+                    if filename in self.tables:
+                        self.tables[filename].update(description)
+                    else:
+                        self.tables[filename] = SharedTrialTable(description)
+                except FileNotFoundError:
+                    # the service released the block before it was mapped, an
+                    # error or a newer description follows
+                    continue
+                return self.tables[filename]
+        except TimeoutError:
+            return None
+        finally:
+            self.socket.settimeout(None)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def run_service(address: Address = DefaultAddress, interval: float = 0.5):
+    """Runs a `TDRService` until it is interrupted or terminated."""
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+
+    async def serve():
+        if os.name == "posix":
+            # shut down cleanly on SIGTERM, so that the shared memory is released
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        await TDRService(address, interval=interval).serve()
+
+    try:
+        asyncio.run(serve())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,134 @@
+import math
+from dataclasses import dataclass, field
+
+from .readTDR import Trial, TrialOutcome
+
+
+@dataclass
+class QuantileSketch:
+    """Mergeable streaming quantile estimate with bounded relative error.
+
+    Positive values are counted in logarithmically spaced buckets, so that any
+    quantile is returned with a relative error of at most `relativeAccuracy`.
+    Memory grows with the logarithm of the value range, not with the number of
+    values, e.g. ~700 buckets cover 1 ms to 1000 s at 1 % accuracy. Values <= 0
+    are counted separately and reported as 0.
+    """
+
+    relativeAccuracy: float = 0.01
+    count: int = 0
+    nonPositiveCount: int = 0
+    buckets: dict[int, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._gamma = (1 + self.relativeAccuracy) / (1 - self.relativeAccuracy)
+        self._logGamma = math.log(self._gamma)
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= 0.0:
+            self.nonPositiveCount += 1
+            return
+        key = math.ceil(math.log(value) / self._logGamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relativeAccuracy != self.relativeAccuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.count += other.count
+        self.nonPositiveCount += other.nonPositiveCount
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> float:
+        """Returns the estimated `q`-quantile (0 <= q <= 1) or None if empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.nonPositiveCount:
+            return 0.0
+        cumulative = self.nonPositiveCount
+        for key in sorted(self.buckets):
+            cumulative += self.buckets[key]
+            if cumulative > rank:
+                # midpoint of bucket (gamma^(key-1), gamma^key] in relative terms
+                return 2 * self._gamma**key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+
+@dataclass
+class SessionStats:
+    """Running statistics of a session, updated one trial at a time.
+
+    Outcome counts, total reward and the number/sum of reaction times are kept
+    exactly, reaction time and trial duration quantiles in a `QuantileSketch`.
+    As in plotTDR, reward and reaction times are taken from hits only and
+    reaction times <= 0 are ignored. Statistics of several sessions or rigs can
+    be combined with `merge`.
+    """
+
+    nTrials: int = 0
+    outcomeCounts: dict[TrialOutcome, int] = field(
+        default_factory=lambda: {outcome: 0 for outcome in TrialOutcome}
+    )
+    totalRewardMS: float = 0.0
+    reactionTimeSumMS: float = 0.0
+    reactionTimes: QuantileSketch = field(default_factory=QuantileSketch)
+    trialDurations: QuantileSketch = field(default_factory=QuantileSketch)
+
+    def add(self, trial: Trial):
+        self.add_values(
+            outcome=trial.outcome,
+            rewardDurationMS=trial.rewardDurationMS,
+            reactionTimeMS=trial.reactionTimeMS,
+            trialDurationMS=trial.get_trial_duration(),
+        )
+
+    def add_values(
+        self,
+        outcome: TrialOutcome,
+        rewardDurationMS: float,
+        reactionTimeMS: float,
+        trialDurationMS: float = None,
+    ):
+        """Adds a trial given by its values, e.g. when only the $TH1 line was read."""
+        self.nTrials += 1
+        self.outcomeCounts[outcome] += 1
+        if outcome == TrialOutcome.Hit:
+            self.totalRewardMS += rewardDurationMS
+            if reactionTimeMS > 0.0:
+                self.reactionTimeSumMS += reactionTimeMS
+                self.reactionTimes.add(reactionTimeMS)
+        if trialDurationMS is not None:
+            self.trialDurations.add(trialDurationMS)
+
+    def update(self, trials: list[Trial]):
+        for trial in trials:
+            self.add(trial)
+
+    def merge(self, other: "SessionStats"):
+        self.nTrials += other.nTrials
+        for outcome, count in other.outcomeCounts.items():
+            self.outcomeCounts[outcome] += count
+        self.totalRewardMS += other.totalRewardMS
+        self.reactionTimeSumMS += other.reactionTimeSumMS
+        self.reactionTimes.merge(other.reactionTimes)
+        self.trialDurations.merge(other.trialDurations)
+
+    def get_outcome_counts(self) -> dict[str, int]:
+        """Returns the outcome counts in the format of `TDR.get_outcome_counts`."""
+        return {outcome.name: count for outcome, count in self.outcomeCounts.items()}
+
+    def get_mean_reaction_time(self) -> float:
+        if self.reactionTimes.count == 0:
+            return None
+        return self.reactionTimeSumMS / self.reactionTimes.count
+
+    def get_median_reaction_time(self) -> float:
+        return self.reactionTimes.median()
+
+    def get_median_trial_duration(self) -> float:
+        return self.trialDurations.median()
@@ -0,0 +1,60 @@
+import datetime
+import pathlib
+import re
+from dataclasses import dataclass, field
+
+from .readTDR import FileStartHeader, TrialOutcome, decode_lines, map_archive
+from .stats import SessionStats
+
+TrialHeaderPattern = re.compile(rb"^\$TH1[^\r\n]*", re.MULTILINE)
+
+
+@dataclass
+class SessionSummary:
+    filename: pathlib.Path
+    date: datetime.date = None
+    startTime: datetime.time = None
+    iniFile: str = None
+    stats: SessionStats = field(default_factory=SessionStats)
+    stimulusCounts: dict[int, int] = field(default_factory=dict)
+
+
+def quick_summary(filename: pathlib.Path) -> SessionSummary:
+    """Summarizes a TDR file from its $FH1 and $TH1 lines only.
+
+    All other lines are skipped by a regular expression on the raw bytes, so
+    this is much faster than `read_tdr`. Trial durations are not available
+    without $TS1, so `stats.trialDurations` stays empty.
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+
+    summary = SessionSummary(filename=pathlib.Path(filename))
+    if data.startswith(b"$FH1"):
+        fileStartHeader = FileStartHeader()
+        headerLines = b"\n".join(data[:4096].split(b"\n")[: fileStartHeader.nLines])
+        fileStartHeader.from_lines(decode_lines(headerLines))
+        summary.date = fileStartHeader.date
+        summary.startTime = fileStartHeader.startTime
+        summary.iniFile = fileStartHeader.iniFile
+
+    for match in TrialHeaderPattern.finditer(data):
+        tokens = match.group().split()
+        stimulusNumber = int(tokens[4])
+        summary.stimulusCounts[stimulusNumber] = summary.stimulusCounts.get(stimulusNumber, 0) + 1
+        summary.stats.add_values(
+            outcome=TrialOutcome(int(tokens[8])),
+            reactionTimeMS=float(tokens[11]),
+            rewardDurationMS=float(tokens[12]),
+        )
+    return summary
+
+
+def summarize_archive(
+    directory: pathlib.Path, pattern: str = "**/*.tdr", workers: int = None
+) -> list[SessionSummary]:
+    """Runs `quick_summary` on all TDR files in `directory` matching `pattern` in parallel.
+
+    See `map_archive`.
+    """
+    return map_archive(quick_summary, directory, pattern=pattern, workers=workers, chunksize=8)
@@ -155,3 +155,512 @@ def test_ObjectHeader():
 
     # TODO: add tests for ObjectSubheader1
 
+
+
+def test_watch_tdr(tmp_path):
+    import asyncio
+
+    import pytest
+
+    source = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    lines = source.read_bytes().splitlines(keepends=True)
+    iTrialStarts = [i for i, line in enumerate(lines) if line.startswith(b"$TH1")]
+    filename = tmp_path / "watched.tdr"
+    filename.write_bytes(b"".join(lines[: iTrialStarts[2]]))
+
+    async def collect():
+        trials = []
+        async for trial in readTDR.watch_tdr(filename, interval=0.01, settle=0.1):
+            trials.append(trial)
+            if len(trials) == 2:
+                # append remaining trials while watching
+                with open(filename, "ab") as file:
+                    file.write(b"".join(lines[iTrialStarts[2] :]))
+            if len(trials) == 5:
+                return trials
+
+    trials = asyncio.run(asyncio.wait_for(collect(), timeout=10))
+    assert trials == readTDR.read_tdr(source).get_trials()
+
+    async def collect_until_idle(filename, from_start, append=b""):
+        trials = []
+
+        async def watch():
+            async for trial in readTDR.watch_tdr(filename, interval=0.01, settle=0.1, from_start=from_start):
+                trials.append(trial)
+
+        task = asyncio.create_task(watch())
+        await asyncio.sleep(0.05)
+        with open(filename, "ab") as file:
+            file.write(append)
+        await asyncio.sleep(0.5)
+        task.cancel()
+        return trials
+
+    # a last trial cut off within $TS2 is dropped with a warning
+    truncated = tmp_path / "truncated.tdr"
+    data = source.read_bytes()
+    truncated.write_bytes(data[: data.rfind(b"$TS2") + 30])
+    with pytest.warns(UserWarning, match="incomplete last trial"):
+        trials = asyncio.run(collect_until_idle(truncated, from_start=True))
+    assert len(trials) == 4
+
+    # trials already complete when watching starts are not yielded
+    partial = tmp_path / "partial.tdr"
+    partial.write_bytes(b"".join(lines[: iTrialStarts[3]]))
+    trials = asyncio.run(collect_until_idle(partial, from_start=False, append=b"".join(lines[iTrialStarts[3] :])))
+    expected = readTDR.read_tdr(source).get_trials()[3:]
+    assert [trial.trialNumber for trial in trials] == [trial.trialNumber for trial in expected]
+
+    # also if the file does not end with a newline, like test.tdr
+    idle = tmp_path / "idle.tdr"
+    idle.write_bytes(source.read_bytes())
+    assert not source.read_bytes().endswith(b"\n")
+    assert asyncio.run(collect_until_idle(idle, from_start=False)) == []
+
+    # a truncated file is read again from the start
+    async def collect_after_truncation():
+        trials = []
+
+        async def watch():
+            async for trial in readTDR.watch_tdr(idle, interval=0.01, settle=0.1, from_start=False):
+                trials.append(trial)
+
+        task = asyncio.create_task(watch())
+        await asyncio.sleep(0.05)
+        idle.write_bytes(b"".join(lines[: iTrialStarts[2]]))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        return trials
+
+    with pytest.warns(UserWarning, match="truncated"):
+        trials = asyncio.run(collect_after_truncation())
+    assert [trial.trialNumber for trial in trials] == [1, 2]
+
+
+def test_SessionStats():
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+    trials = tdr.get_trials()
+
+    stats = readTDR.SessionStats()
+    stats.update(trials)
+    assert stats.nTrials == 5
+    assert stats.get_outcome_counts() == tdr.get_outcome_counts()
+    assert stats.totalRewardMS == sum(trial.rewardDurationMS for trial in tdr.get_hits())
+
+    # merging partial statistics gives the same result
+    merged = readTDR.SessionStats()
+    merged.update(trials[:2])
+    rest = readTDR.SessionStats()
+    rest.update(trials[2:])
+    merged.merge(rest)
+    assert merged == stats
+
+
+def test_QuantileSketch():
+    sketch = readTDR.QuantileSketch(relativeAccuracy=0.01)
+    values = [float(v) for v in range(1, 1001)]
+    for value in values:
+        sketch.add(value)
+    assert sketch.count == 1000
+    for q in [0.1, 0.5, 0.9]:
+        exact = values[round(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact
+
+
+def test_read_tdr_where():
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+
+    hits = readTDR.read_tdr(filename, where=readTDR.TrialQuery(outcomes=[readTDR.TrialOutcome.Hit]))
+    assert hits.get_trials() == tdr.get_hits()
+    assert isinstance(hits.headers[0], readTDR.FileStartHeader)
+
+    trials = tdr.get_trials()
+    query = readTDR.TrialQuery(
+        trialNumbers=range(2, 5),
+        tRelTrialStartMIN=(trials[2].tRelTrialStartMIN, float("inf")),
+    )
+    selected = readTDR.read_tdr(filename, where=query).get_trials()
+    assert selected == trials[2:4]
+
+    nothing = readTDR.read_tdr(filename, where=lambda header: False)
+    assert nothing.get_trials() == []
+
+    # `where` is called once per trial, with $TS1 parsed unless it does not
+    # need the start time
+    calls = []
+    readTDR.read_tdr(filename, where=lambda header: calls.append(header.subheader1) or True)
+    assert len(calls) == len(trials) and None not in calls
+    assert not readTDR.TrialQuery(outcomes=[readTDR.TrialOutcome.Hit]).needsStartTime
+
+    class Recorder:
+        needsStartTime = False
+
+        def __call__(self, header):
+            calls.append(header.subheader1)
+            return True
+
+    calls = []
+    assert readTDR.read_tdr(filename, where=Recorder()).get_trials() == trials
+    assert calls == [None] * len(trials)
+
+    # trials without start time are rejected if a time range is given
+    header = readTDR.TrialHeader()
+    header.from_lines(["$TH1   5   5   1   0   0   0   1   1   0   0   420.0   60.0   3   1   -1   0.0"])
+    assert not readTDR.TrialQuery(tRelTrialStartMIN=(0.0, float("inf")))(header)
+
+
+def test_validate_tdr(tmp_path):
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    report = readTDR.validate_tdr(filename)
+    assert report.ok
+    assert report.nTrials == 5
+
+    lines = filename.read_bytes().splitlines(keepends=True)
+    iTrialStarts = [i for i, line in enumerate(lines) if line.startswith(b"$TH1")]
+
+    # rig crashed while writing $TS2 of the last trial
+    truncated = tmp_path / "truncated.tdr"
+    truncated.write_bytes(b"".join(lines[: iTrialStarts[-1] + 2]) + lines[iTrialStarts[-1] + 2][:40])
+    report = readTDR.validate_tdr(truncated)
+    assert not report.ok
+    assert report.nTrials == 5
+    assert any("truncated" in issue.message for issue in report.issues)
+
+    # missing trial with wrong line count of $OH1
+    missing = tmp_path / "missing.tdr"
+    corrupt = lines[: iTrialStarts[1]] + lines[iTrialStarts[2] :]
+    iObject = corrupt.index(next(line for line in corrupt if line.startswith(b"$OH1  2")))
+    corrupt[iObject] = corrupt[iObject].replace(b"$OH1  2", b"$OH1  3", 1)
+    missing.write_bytes(b"".join(corrupt))
+    report = readTDR.validate_tdr(missing)
+    assert report.nTrials == 4
+    assert [issue.lineNumber for issue in report.issues] == [iObject + 1, iTrialStarts[1] + 1]
+
+    reports = readTDR.validate_archive(tmp_path, workers=2)
+    assert [report.filename.name for report in reports] == ["missing.tdr", "truncated.tdr"]
+
+
+def test_get_event_table():
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+    trials = tdr.get_trials()
+    events = tdr.get_event_table()
+
+    assert all(events.tMS[1:] >= events.tMS[:-1])
+    assert set(events.iTrial) == set(range(len(trials)))
+
+    # first trial: interval 1 starts 2 s after the trial and ends with the lever press
+    tTrialStartMS = trials[0].tRelTrialStartMIN * 60000.0
+    first = events[events.iTrial == 0]
+    rise = first[(first.code == readTDR.EventCode.PositiveTriggerTransition.value) & (first.interval == 1)]
+    assert rise.tMS == tTrialStartMS + 2000.0
+    signals = first[first.code == readTDR.EventCode.StartStopSignal.value]
+    assert list(signals.interval) == [1, 5]
+    assert signals.tMS[0] == tTrialStartMS + 2000.0 + 1800.0
+
+    iTrial = readTDR.find_trials(events, [tTrialStartMS - 1.0, tTrialStartMS + 3000.0])
+    assert list(iTrial) == [-1, 0]
+    iTrial, interval = readTDR.find_intervals(events, [tTrialStartMS + 3000.0, tTrialStartMS + 3810.0])
+    assert list(iTrial) == [0, 0]
+    assert list(interval) == [1, 2]
+
+
+def test_MorphPDF1():
+    lines = ["$OS1  1  05  1  1   4 -1  250.00 1500.00 1000.00 1000.00    0.00 3340.00  550.00  2   1   0.0 8013   0.0  1   0.0 17   0.0"]
+    header : readTDR.MorphPDF1 = readTDR.MorphPDF1()
+    header.from_lines(lines)
+    assert header.id == "$OS1"
+    assert header.nLines == 1
+    assert header.headerVersion == 5
+    assert header.isActive == True
+    assert header.parameters == [1, 4, -1, 250.0, 1500.0, 1000.0, 1000.0, 0.0, 3340.0, 550.0, 2]
+    assert header.sequence == [(1, 0.0), (8013, 0.0), (1, 0.0), (17, 0.0)]
+
+    # other versions are skipped
+    import pytest
+
+    objectLines = [
+        "$OH1  2 01  3  0 -35.63 -13.22   0.00   0.00   0.00   0.00 Morph PDF 1",
+        lines[0].replace(" 05 ", " 06 "),
+    ]
+    objectHeader = readTDR.ObjectHeader()
+    with pytest.warns(UserWarning, match="Unknown version 06 of \\$OS1 in Morph PDF 1 objects"):
+        objectHeader.from_lines(objectLines)
+    assert objectHeader.typeName == "Morph PDF 1"
+    assert objectHeader.subheaders == []
+
+
+def test_get_object_arrays():
+    import numpy as np
+
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+    trials = tdr.get_trials()
+    arrays = tdr.get_object_arrays()
+
+    nObjects = len(arrays["objectNumber"])
+    assert arrays["xPos"].shape == (len(trials), nObjects)
+    for iTrial, trial in enumerate(trials):
+        for stimulusObject in trial.stimulusObjects:
+            iColumn = list(arrays["objectNumber"]).index(stimulusObject.objectNumber)
+            assert arrays["typeName"][iColumn] == stimulusObject.typeName
+            assert arrays["xPos"][iTrial, iColumn] == stimulusObject.xPos
+            assert arrays["show"][iTrial, iColumn] == stimulusObject.show
+            for subheader in stimulusObject.subheaders:
+                assert arrays["isActive"][iTrial, iColumn] == subheader.isActive
+    assert np.isnan(arrays["xPos"][~arrays["present"]]).all()
+    assert arrays["parameters"][0, 2, 4] == 3500.0
+
+
+def test_service(tmp_path, monkeypatch):
+    import socket
+    import subprocess
+    import sys
+    import time
+
+    import pytest
+
+    source = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    lines = source.read_bytes().splitlines(keepends=True)
+    iTrialStarts = [i for i, line in enumerate(lines) if line.startswith(b"$TH1")]
+    filename = tmp_path / "live.tdr"
+    filename.write_bytes(b"".join(lines[: iTrialStarts[3]]))
+
+    def start_service(*options):
+        return subprocess.Popen(
+            [sys.executable, "-m", "readTDR", "serve", "--interval", "0.05", *options],
+            cwd=pathlib.Path(__file__).parents[2],
+            stderr=subprocess.PIPE,
+        )
+
+    socketPath = tmp_path / "readTDR.sock"
+    service = start_service("--socket", str(socketPath))
+    try:
+        for _ in range(100):
+            if socketPath.exists():
+                break
+            time.sleep(0.1)
+
+        with readTDR.TDRClient(socketPath) as client:
+            # relative paths are resolved by the client, the service runs elsewhere
+            monkeypatch.chdir(tmp_path)
+            table = client.watch("live.tdr")
+            while table.nTrials < 3:
+                table = client.wait(timeout=10)
+            assert table.nTrials == 3
+            assert not table["outcome"].flags.writeable
+
+            with open(filename, "ab") as file:
+                file.write(b"".join(lines[iTrialStarts[3] :]))
+            while table.nTrials < 5:
+                table = client.wait(timeout=10)
+
+            expected = readTDR.read_tdr(source).get_trial_arrays()
+            for name, column in table.columns.items():
+                assert list(column) == list(expected[name])
+            shmName = table.shm.name
+
+            # failing to watch a file is reported to its subscribers
+            with pytest.raises(RuntimeError, match="No such file"):
+                client.watch(tmp_path / "missing.tdr")
+            with pytest.raises(RuntimeError, match="stopped watching"):
+                # raised by watch or, if the block was mapped in time, by wait
+                client.watch(tmp_path)
+                client.wait(timeout=10)
+
+        # the shared memory is freed once the last subscriber disconnected
+        for _ in range(100):
+            if not os.path.exists(f"/dev/shm/{shmName}"):
+                break
+            time.sleep(0.1)
+        assert not os.path.exists(f"/dev/shm/{shmName}")
+    finally:
+        service.terminate()
+        _, stderr = service.communicate()
+    # started as a subcommand, the package does not import the module twice
+    assert b"RuntimeWarning" not in stderr
+
+    # loopback TCP, used where Unix sockets are not available
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    service = start_service("--port", str(port))
+    try:
+        for _ in range(100):
+            try:
+                client = readTDR.TDRClient(("127.0.0.1", port))
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.1)
+        with client:
+            table = client.watch(filename)
+            while table.nTrials < 5:
+                table = client.wait(timeout=10)
+    finally:
+        service.terminate()
+        service.communicate()
+
+
+def test_read_tdr_workers(tmp_path):
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+
+    parallel = readTDR.read_tdr(filename, workers=3)
+    assert parallel.headers == tdr.headers
+    assert parallel.get_trials() == tdr.get_trials()
+    # repeated objects are parsed once per chunk but not shared
+    objects = [header for header in parallel.headers if isinstance(header, readTDR.ObjectHeader)]
+    subheaders = [subheader for header in objects for subheader in header.subheaders]
+    assert len({id(header) for header in objects}) == len(objects)
+    assert len({id(subheader) for subheader in subheaders}) == len(subheaders)
+    lists = [value for subheader in subheaders for value in vars(subheader).values() if isinstance(value, list)]
+    assert len({id(value) for value in lists}) == len(lists)
+
+    query = readTDR.TrialQuery(outcomes=[readTDR.TrialOutcome.Hit])
+    hits = readTDR.read_tdr(filename, where=query, workers=2)
+    assert hits.headers == readTDR.read_tdr(filename, where=query).headers
+
+    empty = tmp_path / "empty.tdr"
+    empty.write_bytes(b"")
+    assert readTDR.read_tdr(empty, workers=2).headers == []
+
+
+def test_quick_summary(capsys):
+    import readTDR.__main__
+
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+    summary = readTDR.quick_summary(filename)
+    assert summary.date == tdr.headers[0].date
+    assert summary.iniFile == tdr.headers[0].iniFile
+    assert summary.stats.get_outcome_counts() == tdr.get_outcome_counts()
+    assert summary.stats.totalRewardMS == sum(trial.rewardDurationMS for trial in tdr.get_hits())
+    assert sum(summary.stimulusCounts.values()) == 5
+
+    readTDR.__main__.main(["summary", str(filename)])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[1].startswith(str(filename))
+
+
+def test_interval_timing():
+    import numpy as np
+
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+    timing = readTDR.get_interval_timing(tdr)
+
+    for iTrial, trial in enumerate(tdr.get_trials()):
+        started = np.array(trial.tPositiveTriggerTransitionMS[: readTDR.nIntervals]) > 0.0
+        assert np.allclose(timing["actualMS"][iTrial, started], trial.get_interval_durations())
+        # the last interval is ended by the response and not checked
+        assert not timing["checked"][iTrial, trial.lastInterval]
+
+    report = readTDR.read_timing_report(filename)
+    assert report.nTrials == 5
+    assert report.nCheckedIntervals == timing["checked"].sum()
+    assert report.maxAbsDeviationMS < 1.0
+    assert report.frameLossRate == 0.0
+    assert np.isnan(report.meanTimeOfFrameLossMS)
+
+    # (0, 0.00) is reported at the trial start and not counted as frame loss
+    lines = filename.read_text().splitlines(keepends=True)
+    iTrialStarts = [i for i, line in enumerate(lines) if line.startswith("$TH1")]
+    for iLine, frameLoss in zip(iTrialStarts, ["0 0.00", "1 0.50", "2 0.00"]):
+        lines[iLine] = " ".join(lines[iLine].split()[:15]) + f" {frameLoss}\n"
+    tdr = readTDR.TDR(filename=filename, headers=readTDR.parse_tdr_lines(lines))
+    timing = readTDR.get_interval_timing(tdr)
+    assert list(timing["frameLoss"]) == [False, True, True, False, False]
+    assert list(timing["frameLossAtStart"]) == [True, False, False, False, False]
+    assert timing["timeOfFrameLossMS"][1] == 500.0
+    report = readTDR.get_timing_report(tdr)
+    assert report.frameLossRate == 0.4
+    assert report.frameLossAtStartRate == 0.2
+    assert report.meanTimeOfFrameLossMS == 250.0
+
+
+def test_decimate():
+    import numpy as np
+    from readTDR.decimate import get_grid_indices, get_m4_indices
+
+    rng = np.random.default_rng(0)
+    x = np.sort(rng.uniform(0.0, 100.0, 100000))
+    y = rng.normal(size=x.size)
+
+    indices = get_m4_indices(x, y, 10.0, 20.0, 50)
+    assert indices.size <= 4 * 50 + 2
+    assert np.all(np.diff(indices) > 0)
+    # the extremes of each bin are kept
+    bins = np.floor((x - 10.0) / 10.0 * 50).astype(int)
+    for iBin in (0, 17, 49):
+        inBin = np.flatnonzero(bins == iBin)
+        assert inBin[np.argmin(y[inBin])] in indices
+        assert inBin[np.argmax(y[inBin])] in indices
+    # the line continues to the edges of the range
+    assert x[indices[0]] < 10.0 and x[indices[-1]] > 20.0
+
+    indices = get_grid_indices(x, y, (0.0, 100.0), (-1.0, 1.0), (100, 20))
+    assert indices.size <= 100 * 20
+    assert np.all(np.abs(y[indices]) <= 1.0)
+
+    # zooming in shows all points of the visible range, also if the
+    # DecimatedLine itself is not referenced
+    import gc
+
+    import pytest
+
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from readTDR.decimate import DecimatedLine
+
+    fig, axes = plt.subplots()
+    (line,) = axes.plot([], [])
+    DecimatedLine(line, x, y)
+    gc.collect()
+    axes.set_xlim(0.0, 100.0)
+    assert line.get_xdata().size < x.size
+    axes.set_xlim(10.0, 10.1)
+    inRange = (x >= 10.0) & (x <= 10.1)
+    assert set(x[inRange]) <= set(line.get_xdata())
+    plt.close(fig)
+
+
+def test_aggregate():
+    import numpy as np
+
+    filename = pathlib.Path(__file__).parent / pathlib.Path("test.tdr")
+    tdr = readTDR.read_tdr(filename)
+    trials = tdr.get_trials()
+    aggregate = readTDR.aggregate_tdr(tdr)
+    assert aggregate.counts.sum() == len(trials)
+    for trial in trials:
+        iStimulus = np.searchsorted(aggregate.stimulusNumbers, trial.stimulusNumber)
+        iTimeSequence = np.searchsorted(aggregate.timeSequences, trial.timeSequence)
+        assert aggregate.counts[iStimulus, iTimeSequence, trial.outcome.value] > 0
+
+    hitRT = [trial.reactionTimeMS for trial in trials if trial.wasHit and trial.reactionTimeMS > 0]
+    hits = aggregate.reactionTimeCounts[..., readTDR.TrialOutcome.Hit.value].sum()
+    assert hits == len(hitRT)
+    assert aggregate.hitReactionTimeHistogram.sum() == len(hitRT)
+    hit = readTDR.TrialOutcome.Hit.value
+    hasHits = aggregate.reactionTimeCounts[..., hit] > 0
+    for q, expected in [(0.0, aggregate.reactionTimeMinMS), (1.0, aggregate.reactionTimeMaxMS)]:
+        quantile = aggregate.get_hit_reaction_time_quantile(q)
+        assert np.array_equal(quantile[hasHits], expected[..., hit][hasHits])
+        assert np.all(np.isnan(quantile[~hasHits]))
+
+    # merging with a session of other conditions extends the condition axes
+    other = readTDR.ConditionAggregate.empty(aggregate.stimulusNumbers + 1000, aggregate.timeSequences)
+    merged = aggregate.merge(aggregate).merge(other)
+    assert merged.stimulusNumbers.size == 2 * aggregate.stimulusNumbers.size
+    assert merged.counts.sum() == 2 * len(trials)
+    assert np.array_equal(merged.reactionTimeMinMS[: aggregate.stimulusNumbers.size], aggregate.reactionTimeMinMS)
+    assert np.allclose(
+        merged.get_mean_reaction_time()[: aggregate.stimulusNumbers.size],
+        aggregate.get_mean_reaction_time(),
+        equal_nan=True,
+    )
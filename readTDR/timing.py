@@ -0,0 +1,130 @@
+import pathlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from .readTDR import TDR, FileStartHeader, IntervalType, map_archive, nIntervals, read_tdr_without_objects
+
+
+def get_interval_timing(tdr: TDR) -> dict[str, np.ndarray]:
+    """Returns the intended and actual interval durations of all trials as arrays.
+
+    All arrays are (nTrials, nIntervals) unless noted otherwise:
+      - "intendedMS": intended duration from $TS2
+      - "actualMS": duration between the trigger transitions of $TS1, NaN for
+        intervals that did not occur
+      - "checked": whether the interval should last as intended, i.e. it
+        occurred, is of type Normal and is not the last interval of the trial,
+        which is ended by the response or an error
+      - "deviationMS", "deviationFrames": actual - intended duration of checked
+        intervals in ms and in frames, NaN otherwise
+      - "quantizationErrorMS": distance of the actual duration to the nearest
+        multiple of the frame period
+      - "frameLoss": (nTrials,) whether a frame loss was reported within the
+        trial, i.e. intervalOfFrameLoss >= 0 except for frameLossAtStart
+      - "frameLossAtStart": (nTrials,) whether a frame loss was reported at
+        interval 0, time 0.00. VStim reports this for some trials without any
+        deviation of the measured intervals, so it is not counted as frame loss
+      - "timeOfFrameLossMS": (nTrials,) timeOfFrameLoss in ms for trials with a
+        reported frame loss (including those at the start), NaN otherwise
+    """
+    trials = tdr.get_trials()
+    framePeriodMS = 1000.0 / get_refresh_rate(tdr)
+
+    tRise = np.array([trial.tPositiveTriggerTransitionMS[:nIntervals] for trial in trials]).reshape(-1, nIntervals)
+    tFall = np.array([trial.tNegativeTriggerTransitionMS[:nIntervals] for trial in trials]).reshape(-1, nIntervals)
+    intendedMS = np.array([trial.tIntendedIntervalDurationMS[:nIntervals] for trial in trials]).reshape(-1, nIntervals)
+    intervalType = np.array(
+        [[intervalType.value for intervalType in trial.intervalType[:nIntervals]] for trial in trials]
+    ).reshape(-1, nIntervals)
+    lastInterval = np.array([trial.lastInterval for trial in trials])
+    intervalOfFrameLoss = np.array([trial.intervalOfFrameLoss for trial in trials])
+    timeOfFrameLoss = np.array([trial.timeOfFrameLoss for trial in trials], dtype=float)
+    reported = intervalOfFrameLoss >= 0
+    frameLossAtStart = reported & (intervalOfFrameLoss == 0) & (timeOfFrameLoss == 0.0)
+
+    occurred = (tRise >= 0.0) & (tFall >= 0.0)
+    actualMS = np.where(occurred, tFall - tRise, np.nan)
+    checked = (
+        occurred
+        & (intervalType == IntervalType.Normal.value)
+        & (np.arange(nIntervals) < lastInterval[:, np.newaxis])
+    )
+    deviationMS = np.where(checked, actualMS - intendedMS, np.nan)
+
+    return {
+        "intendedMS": intendedMS,
+        "actualMS": actualMS,
+        "checked": checked,
+        "deviationMS": deviationMS,
+        "deviationFrames": deviationMS / framePeriodMS,
+        "quantizationErrorMS": actualMS - np.round(actualMS / framePeriodMS) * framePeriodMS,
+        "frameLoss": reported & ~frameLossAtStart,
+        "frameLossAtStart": frameLossAtStart,
+        "timeOfFrameLossMS": np.where(reported, timeOfFrameLoss * 1000.0, np.nan),
+    }
+
+
+def get_refresh_rate(tdr: TDR) -> float:
+    for header in tdr.headers:
+        if isinstance(header, FileStartHeader):
+            return header.refreshRate
+    raise ValueError(f"{tdr.filename} has no file start header")
+
+
+@dataclass
+class TimingReport:
+    filename: pathlib.Path
+    refreshRate: float
+    nTrials: int
+    # number of intervals compared with their intended duration
+    nCheckedIntervals: int
+    meanDeviationMS: float
+    stdDeviationMS: float
+    maxAbsDeviationMS: float
+    # fraction of checked intervals that are off by more than half a frame
+    fractionOffByFrame: float
+    rmsQuantizationErrorMS: float
+    # fraction of trials with a frame loss within the trial, see `get_interval_timing`
+    frameLossRate: float
+    # fraction of trials with a frame loss reported at interval 0, time 0.00
+    frameLossAtStartRate: float
+    meanTimeOfFrameLossMS: float
+
+
+def reduce_or_nan(reduce, values: np.ndarray) -> float:
+    return float(reduce(values)) if values.size else np.nan
+
+
+def get_timing_report(tdr: TDR) -> TimingReport:
+    timing = get_interval_timing(tdr)
+    deviationMS = timing["deviationMS"][timing["checked"]]
+    deviationFrames = timing["deviationFrames"][timing["checked"]]
+    quantizationErrorMS = timing["quantizationErrorMS"][~np.isnan(timing["actualMS"])]
+    return TimingReport(
+        filename=tdr.filename,
+        refreshRate=get_refresh_rate(tdr),
+        nTrials=timing["frameLoss"].size,
+        nCheckedIntervals=deviationMS.size,
+        meanDeviationMS=reduce_or_nan(np.mean, deviationMS),
+        stdDeviationMS=reduce_or_nan(np.std, deviationMS),
+        maxAbsDeviationMS=reduce_or_nan(np.max, np.abs(deviationMS)),
+        fractionOffByFrame=reduce_or_nan(np.mean, np.abs(deviationFrames) > 0.5),
+        rmsQuantizationErrorMS=float(np.sqrt(reduce_or_nan(np.mean, quantizationErrorMS**2))),
+        frameLossRate=reduce_or_nan(np.mean, timing["frameLoss"]),
+        frameLossAtStartRate=reduce_or_nan(np.mean, timing["frameLossAtStart"]),
+        meanTimeOfFrameLossMS=reduce_or_nan(np.mean, timing["timeOfFrameLossMS"][timing["frameLoss"]]),
+    )
+
+
+def read_timing_report(filename: pathlib.Path) -> TimingReport:
+    """Returns the timing report of a TDR file, skipping its stimulus objects."""
+    return get_timing_report(read_tdr_without_objects(filename))
+
+
+def audit_archive(directory: pathlib.Path, pattern: str = "**/*.tdr", workers: int = None) -> list[TimingReport]:
+    """Returns the timing reports of all TDR files in `directory` matching `pattern`.
+
+    The files are processed in parallel, see `map_archive`.
+    """
+    return map_archive(read_timing_report, directory, pattern=pattern, workers=workers)
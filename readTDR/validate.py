@@ -0,0 +1,133 @@
+import pathlib
+from dataclasses import dataclass, field
+
+from .readTDR import map_archive, nIntervals
+
+TrialSubheaderIds = [b"$TS1", b"$TS2", b"$TS3", b"$TS4"]
+SubheaderIds = TrialSubheaderIds + [b"$OS1"]
+
+# minimum number of whitespace separated tokens of the first line of a header
+MinTokenCounts = {
+    b"$FH1": 3,
+    b"$TH1": 17,
+    b"$TS1": 6 + 2 * nIntervals,
+    b"$TS2": 3 + nIntervals,
+    b"$TS3": 3 + nIntervals,
+    b"$TS4": 4,
+    b"$OH1": 12,
+}
+
+
+@dataclass
+class ValidationIssue:
+    # 1-based line number in the file
+    lineNumber: int
+    message: str
+
+
+@dataclass
+class ValidationReport:
+    filename: pathlib.Path
+    nTrials: int = 0
+    issues: list[ValidationIssue] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.issues) == 0
+
+
+def validate_tdr(filename: pathlib.Path) -> ValidationReport:
+    """Checks the structure of a TDR file without parsing it into headers.
+
+    Checks that the file starts with $FH1, that the declared nLines of each
+    header match the position of the next header, that trial numbers are
+    consecutive, that every trial has the subheaders $TS1 to $TS4, and that
+    neither a header nor the final trial is truncated.
+    """
+    report = ValidationReport(filename=filename)
+
+    def add_issue(iLine: int, message: str):
+        report.issues.append(ValidationIssue(lineNumber=iLine + 1, message=message))
+
+    with open(filename, "rb") as file:
+        lines = file.read().splitlines()
+
+    if not lines or not lines[0].startswith(b"$FH1"):
+        add_issue(0, "File does not start with $FH1")
+
+    lastTrialNumber = None
+    iLine = 0
+    while iLine < len(lines):
+        line = lines[iLine]
+        if not line.startswith(b"$"):
+            # resynchronize at the next header
+            iNext = iLine + 1
+            while iNext < len(lines) and not lines[iNext].startswith(b"$"):
+                iNext += 1
+            add_issue(iLine, f"{iNext - iLine} line(s) outside of any header")
+            iLine = iNext
+            continue
+
+        tokens = line.split(maxsplit=4)
+        try:
+            headerId = tokens[0]
+            nLines = int(tokens[1])
+            headerVersion = int(tokens[2])
+        except (IndexError, ValueError):
+            add_issue(iLine, "Malformed header line")
+            iLine += 1
+            continue
+        name = headerId.decode(errors="replace")
+
+        # same workaround for VStim bug #210 as in read_tdr
+        if headerId == b"$TH1" and headerVersion == 5:
+            nLines = 5
+
+        if nLines < 1:
+            add_issue(iLine, f"{name} declares {nLines} lines")
+            nLines = 1
+
+        block = lines[iLine : iLine + nLines]
+        if len(block) < nLines:
+            add_issue(iLine, f"{name} declares {nLines} lines, but the file ends after {len(block)}")
+
+        for iBlockLine, blockLine in enumerate(block):
+            blockId = blockLine.split(maxsplit=1)[0] if blockLine.strip() else b""
+            if blockId in MinTokenCounts and len(blockLine.split()) < MinTokenCounts[blockId]:
+                add_issue(iLine + iBlockLine, f"{blockId.decode()} line is truncated")
+            if iBlockLine > 0 and blockLine.startswith(b"$") and blockId not in SubheaderIds:
+                add_issue(iLine, f"{name} declares {nLines} lines, but header starts at line {iLine + iBlockLine + 1}")
+                nLines = iBlockLine
+                block = block[:nLines]
+                break
+
+        if headerId == b"$TH1":
+            report.nTrials += 1
+            trialNumber = int(tokens[3]) if len(tokens) > 3 and tokens[3].isdigit() else None
+            if lastTrialNumber is not None and trialNumber != lastTrialNumber + 1:
+                add_issue(iLine, f"Trial {trialNumber} follows trial {lastTrialNumber}")
+            lastTrialNumber = trialNumber
+
+            subheaderIds = [blockLine.split(maxsplit=1)[0] for blockLine in block[1:] if blockLine.strip()]
+            for subheaderId in TrialSubheaderIds:
+                if subheaderId not in subheaderIds:
+                    add_issue(iLine, f"Trial {trialNumber} has no {subheaderId.decode()}")
+        elif headerId in SubheaderIds:
+            add_issue(iLine, f"{name} outside of its header")
+
+        iNext = iLine + nLines
+        if iNext < len(lines) and not lines[iNext].startswith(b"$"):
+            add_issue(iLine, f"{name} declares {nLines} lines, but is not followed by a header")
+        iLine = iNext
+
+    return report
+
+
+def validate_archive(
+    directory: pathlib.Path, pattern: str = "**/*.tdr", workers: int = None
+) -> list[ValidationReport]:
+    """Validates all TDR files in `directory` matching `pattern` in parallel.
+
+    See `map_archive`.
+    """
+    return map_archive(validate_tdr, directory, pattern=pattern, workers=workers, chunksize=8)
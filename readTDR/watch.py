@@ -0,0 +1,135 @@
+import asyncio
+import os
+import pathlib
+import warnings
+from collections.abc import AsyncIterator
+
+from .readTDR import TDR, Trial, TrialHeader, decode_lines, parse_tdr_lines
+
+
+def split_completed_trials(lines: list[str], flush: bool = False) -> tuple[list[str], list[str]]:
+    """Splits `lines` into the lines of completed trials and the remaining lines.
+
+    A trial is complete once the next `$TH1` or the `$FH2` header has been
+    written. If `flush` is True, the last trial is considered complete as well.
+    """
+    if flush:
+        return lines, []
+
+    for iLine in range(len(lines) - 1, -1, -1):
+        if lines[iLine].startswith("$FH2"):
+            return lines, []
+        if lines[iLine].startswith("$TH1"):
+            return lines[:iLine], lines[iLine:]
+    return [], lines
+
+
+def parse_trials(filename: pathlib.Path, lines: list[str]) -> list[Trial]:
+    """Parses the trials in `lines`, dropping an incomplete last trial with a warning.
+
+    The last trial is incomplete if the file ends within it, e.g. if VStim
+    crashed while writing it.
+    """
+    iLastTrial = max((iLine for iLine, line in enumerate(lines) if line.startswith("$TH1")), default=0)
+    headers = parse_tdr_lines(lines[:iLastTrial])
+    try:
+        lastHeaders = parse_tdr_lines(lines[iLastTrial:])
+    except Exception as error:
+        warnings.warn(f"Dropping incomplete last trial of {filename}: {error!r}", category=UserWarning)
+        lastHeaders = []
+    for header in lastHeaders:
+        if isinstance(header, TrialHeader) and None in (
+            header.subheader1,
+            header.subheader2,
+            header.subheader3,
+            header.subheader4,
+        ):
+            warnings.warn(f"Dropping incomplete last trial of {filename}", category=UserWarning)
+            lastHeaders = []
+            break
+    headers += lastHeaders
+    return TDR(filename=filename, headers=headers).get_trials()
+
+
+async def watch_tdr(
+    filename: pathlib.Path,
+    interval: float = 0.5,
+    settle: float = 2.0,
+    from_start: bool = True,
+) -> AsyncIterator[Trial]:
+    """Asynchronously yields the trials of a TDR file as they are written.
+
+    The file is polled with `os.stat` every `interval` seconds and only the bytes
+    appended since the last poll are read and parsed, so an idle file costs one
+    `stat` call per poll. A trial is yielded as soon as the next trial header
+    follows it, or when the file has not grown for `settle` seconds (VStim writes
+    the record of a trial in one go at the end of the trial). If `from_start` is
+    False, only trials completed after the call are yielded.
+
+    The generator runs until it is closed, e.g. by breaking out of the
+    `async for` loop or by cancelling the task iterating it.
+    """
+    loop = asyncio.get_running_loop()
+    offset = 0
+    lastSize = 0
+    lastGrowth = loop.time()
+    pending: list[str] = []
+    # lines of the trial that was last in the file when called with from_start=False
+    nStaleLines = 0
+
+    if not from_start:
+        with open(filename, "rb") as file:
+            data = file.read()
+        offset = data.rfind(b"\n") + 1
+        lastSize = len(data)
+        # keep the last trial, it may not be complete yet
+        iLastTrial = data.rfind(b"\n$TH1", 0, offset) + 1
+        if iLastTrial > 0:
+            pending = decode_lines(data[iLastTrial:offset])
+            # up to the end of the file, including a last line without newline
+            nStaleLines = len(decode_lines(data[iLastTrial:]))
+
+    while True:
+        try:
+            size = os.stat(filename).st_size
+        except FileNotFoundError:
+            size = 0
+
+        if size < offset:
+            warnings.warn(f"{filename} was truncated, restarting", category=UserWarning)
+            offset = 0
+            pending = []
+            nStaleLines = 0
+
+        if size != lastSize:
+            lastSize = size
+            lastGrowth = loop.time()
+        flush = loop.time() - lastGrowth >= settle
+
+        if size > offset:
+            with open(filename, "rb") as file:
+                file.seek(offset)
+                data = file.read(size - offset)
+            # only consume complete lines unless the file is idle
+            nComplete = len(data) if flush else data.rfind(b"\n") + 1
+            pending += decode_lines(data[:nComplete])
+            offset += nComplete
+
+        completed, pending = split_completed_trials(pending, flush=flush)
+        if nStaleLines and completed:
+            # skip the last trial present at the call unless lines were appended to it
+            if len(completed) <= nStaleLines or completed[nStaleLines].startswith("$TH1"):
+                completed = completed[nStaleLines:]
+            nStaleLines = 0
+
+        if completed and not completed[0].startswith(("$FH1", "$TH1")):
+            # lines appended to a trial that was already flushed
+            warnings.warn(
+                f"Dropping {len(completed)} lines of {filename} without trial header",
+                category=UserWarning,
+            )
+        elif completed:
+            for trial in await asyncio.to_thread(parse_trials, filename, completed):
+                yield trial
+
+        await asyncio.sleep(interval)